@@ -0,0 +1,111 @@
+# ------------------- IMPORTS -------------------
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
+import re
+import tempfile
+
+from metrics import report_error
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; avatars are then served as uploaded
+    Image = None
+
+# ------------------- CONSTANTS -------------------
+MAX_UPLOAD_BYTES = 5 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+AVATAR_SIZE = 128
+# Variant extension -> (Pillow format, save options, mimetype)
+VARIANTS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}, "image/webp"),
+    "jpg": ("JPEG", {"quality": 82, "optimize": True}, "image/jpeg"),
+}
+DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class AvatarTooLarge(Exception):
+    pass
+
+
+def is_digest(value):
+    return bool(value) and bool(DIGEST_RE.match(value))
+
+
+# ------------------- STORE -------------------
+class AvatarStore:
+    """Content-addressed profile pictures with small pre-rendered variants.
+
+    Uploads are streamed to disk under their SHA-256, so identical pictures
+    share one file and nobody can overwrite anyone else's. A single
+    background thread turns each original into AVATAR_SIZE square WebP and
+    JPEG variants; until that finishes the original is served.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.originals = os.path.join(folder, "originals")
+        os.makedirs(self.originals, exist_ok=True)
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="avatars")
+
+    def variant_path(self, digest, ext):
+        return os.path.join(self.folder, f"{digest}.{ext}")
+
+    def original_path(self, digest):
+        return os.path.join(self.originals, digest)
+
+    def save_upload(self, stream):
+        """Stream an upload to disk, capped at MAX_UPLOAD_BYTES; returns its digest."""
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.originals, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while chunk := stream.read(CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > MAX_UPLOAD_BYTES:
+                        raise AvatarTooLarge()
+                    digest.update(chunk)
+                    out.write(chunk)
+            digest = digest.hexdigest()
+            os.replace(tmp_path, self.original_path(digest))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._executor.submit(self.process, digest)
+        return digest
+
+    def adopt(self, path):
+        """Move an old static/images avatar into the store."""
+        with open(path, "rb") as f:
+            return self.save_upload(f)
+
+    def process(self, digest):
+        if Image is None or all(
+            os.path.exists(self.variant_path(digest, ext)) for ext in VARIANTS
+        ):
+            return
+        try:
+            with Image.open(self.original_path(digest)) as img:
+                # Let JPEG decode at a reduced scale instead of full size
+                img.draft("RGB", (AVATAR_SIZE * 2, AVATAR_SIZE * 2))
+                img = ImageOps.exif_transpose(img).convert("RGB")
+                img = ImageOps.fit(img, (AVATAR_SIZE, AVATAR_SIZE), Image.LANCZOS)
+                for ext, (fmt, options, _) in VARIANTS.items():
+                    target = self.variant_path(digest, ext)
+                    img.save(target + ".part", fmt, **options)
+                    os.replace(target + ".part", target)
+        except Exception as e:
+            # Not an image Pillow understands; the original is still served
+            report_error("avatars", f"{digest}: {e}")
+
+    def find(self, digest, accept_webp):
+        """(path, mimetype, is_final) for the best file we have, or None."""
+        for ext in ("webp", "jpg") if accept_webp else ("jpg",):
+            path = self.variant_path(digest, ext)
+            if os.path.exists(path):
+                return path, VARIANTS[ext][2], True
+        path = self.original_path(digest)
+        if os.path.exists(path):
+            return path, None, False
+        return None
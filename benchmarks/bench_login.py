@@ -0,0 +1,114 @@
+"""Login throughput with password hashing inline vs in the hashing pool.
+
+Run from the repo root:
+
+    python benchmarks/bench_login.py --threads 16 --seconds 5
+
+A copy of main.db is used, so the real database is never touched. While
+logins run, one extra thread keeps hitting /class-suggestions to show how
+much a burst of logins slows the cheap routes down.
+"""
+
+# ------------------- IMPORTS -------------------
+from pathlib import Path
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = Path(__file__).resolve().parent.parent
+SHED_BACKOFF = 0.1
+
+
+# ------------------- HELPERS -------------------
+def percentile(samples, p):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * p / 100), len(samples) - 1)]
+
+
+def run(routes, threads, seconds):
+    app = routes.app
+    stop = time.perf_counter() + seconds
+    counts = {"ok": 0, "busy": 0, "other": 0}
+    cheap = []
+    lock = threading.Lock()
+
+    def login_loop():
+        client = app.test_client()
+        while time.perf_counter() < stop:
+            status = client.post(
+                "/login", data={"username": "bench", "password": "bench"}
+            ).status_code
+            key = {302: "ok", 503: "busy"}.get(status, "other")
+            with lock:
+                counts[key] += 1
+            if status == 503:
+                # Real browsers don't hammer straight back; give it a beat
+                time.sleep(SHED_BACKOFF)
+
+    def cheap_loop():
+        client = app.test_client()
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            client.get("/class-suggestions?term=ma")
+            cheap.append((time.perf_counter() - start) * 1000)
+
+    workers = [threading.Thread(target=login_loop) for _ in range(threads)]
+    workers.append(threading.Thread(target=cheap_loop))
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return counts, cheap
+
+
+# ------------------- MAIN -------------------
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    db_path = os.path.join(tmp, "main.db")
+    shutil.copy(ROOT / "main.db", db_path)
+    os.environ["DB_PATH"] = db_path
+    sys.path.insert(0, str(ROOT))
+
+    from werkzeug.security import check_password_hash, generate_password_hash
+    import routes
+
+    routes.init_app()
+    routes.app.secret_key = routes.app.secret_key or "bench"
+    with routes.get_pool(db_path).connection() as conn, conn:
+        conn.execute(
+            "INSERT INTO users(username, password, code, email, is_verified) VALUES(?,?,?,?,?)",
+            ("bench", generate_password_hash("bench"), "99999", "99999@x", True),
+        )
+
+    pooled = routes.verify_password
+    cores = os.cpu_count() or 1
+    # Warm the pool up so process start-up isn't counted
+    pooled(generate_password_hash("warm"), "warm")
+
+    print(f"{args.threads} login threads, {args.seconds}s each, {cores} cores")
+    for name, verify in (("inline", check_password_hash), ("pool", pooled)):
+        routes.verify_password = verify
+        counts, cheap = run(routes, args.threads, args.seconds)
+        rate = counts["ok"] / args.seconds
+        print(
+            f"{name:>6}: {rate:7.1f} logins/s ({rate / cores:.1f}/core), "
+            f"{counts['busy']} shed, {counts['other']} errors, "
+            f"/class-suggestions p50 {percentile(cheap, 50):.1f} ms "
+            f"p95 {percentile(cheap, 95):.1f} ms"
+        )
+    shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
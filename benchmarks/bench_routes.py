@@ -0,0 +1,797 @@
+"""Latency, throughput and queries per request for every route at several catalog sizes.
+
+Run from the repo root:
+
+    python benchmarks/bench_routes.py --scales 1000,10000,100000 --links 1000000
+
+Each scale gets a freshly generated catalog in a temporary database, so the
+real main.db is never touched. Every route is first driven through the
+Flask test client (counting SQL statements per request), then the read
+routes are loaded over real HTTP by --threads client threads. Results are
+appended to benchmarks/results.jsonl tagged with the current commit;
+--compare REV prints how this run moved against an earlier one.
+"""
+
+# ------------------- IMPORTS -------------------
+from io import BytesIO
+from pathlib import Path
+import argparse
+import http.client
+import json
+import logging
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS = Path(__file__).resolve().parent / "results.jsonl"
+SEED = 2025
+ADMIN_CODE = "22298"
+SUBJECTS = [
+    "Mathematics",
+    "English",
+    "Physics",
+    "Chemistry",
+    "Biology",
+    "History",
+    "Geography",
+    "Music",
+    "Drama",
+    "Art",
+    "Design",
+    "Economics",
+    "Accounting",
+    "Computer Science",
+    "Digital Technology",
+    "Te Reo Maori",
+    "French",
+    "Japanese",
+    "Physical Education",
+    "Health",
+    "Statistics",
+    "Calculus",
+    "Media Studies",
+    "Classics",
+    "Psychology",
+    "Agriculture",
+    "Tourism",
+]
+LEVELS = ["Foundation", "General", "Applied", "Advanced", "Extension", "Studio"]
+JOB_WORDS = [
+    "Engineer",
+    "Analyst",
+    "Designer",
+    "Teacher",
+    "Nurse",
+    "Technician",
+    "Developer",
+    "Scientist",
+    "Manager",
+    "Consultant",
+    "Architect",
+    "Chef",
+    "Electrician",
+    "Pilot",
+    "Surveyor",
+    "Pharmacist",
+    "Journalist",
+    "Builder",
+]
+JOB_AREAS = ["Health", "Technology", "Education", "Trades", "Science", "Arts"]
+
+
+# ------------------- SYNTHETIC CATALOG -------------------
+def make_catalog(db_path, n_classes, n_links, rng):
+    """Fill a migrated database with n_classes classes, n_classes // 10 jobs and n_links links."""
+    from werkzeug.security import generate_password_hash
+
+    from migrations import migrate
+
+    migrate(db_path)
+    n_jobs = max(n_classes // 10, 15)
+    n_links = min(n_links, n_classes * n_jobs)
+    classes = []
+    for i in range(n_classes):
+        prerequisites = None
+        # Chain some classes to the one before (a year earlier) so the
+        # prerequisite graph has real depth
+        if i % 5 and rng.random() < 0.3:
+            prerequisites = classes[i - 1][0]
+            if rng.random() < 0.2:
+                prerequisites += " or HOD approval"
+        classes.append(
+            (
+                f"{rng.choice(SUBJECTS)} {rng.choice(LEVELS)} {i}",
+                9 + i % 5,
+                int(rng.random() < 0.2),
+                prerequisites,
+            )
+        )
+    jobs = [
+        (
+            f"{rng.choice(JOB_WORDS)} {rng.choice(JOB_WORDS)} {i}",
+            # Some jobs have no salary yet, as after migration 7
+            rng.randrange(40_000, 160_000, 1000) if i % 20 else None,
+            rng.choice(JOB_AREAS),
+        )
+        for i in range(n_jobs)
+    ]
+    links = set()
+    while len(links) < n_links:
+        links.add((rng.randrange(n_classes) + 1, rng.randrange(n_jobs) + 1))
+
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.executemany(
+            "INSERT INTO classes(name, year, is_mandatory, prerequisites) VALUES(?,?,?,?)",
+            classes,
+        )
+        conn.executemany("INSERT INTO jobs(name, salary_avg, area) VALUES(?,?,?)", jobs)
+        conn.executemany(
+            "INSERT INTO job_classes(class_id, job_id) VALUES(?,?)", sorted(links)
+        )
+        password = generate_password_hash("bench")
+        conn.executemany(
+            "INSERT INTO users(username, password, code, email, is_verified) VALUES(?,?,?,?,?)",
+            [
+                ("bench", password, "99999", "99999@burnside.school.nz", True),
+                (
+                    "admin",
+                    password,
+                    ADMIN_CODE,
+                    ADMIN_CODE + "@burnside.school.nz",
+                    True,
+                ),
+            ],
+        )
+    conn.close()
+    return n_classes, n_jobs, n_links
+
+
+# ------------------- MEASUREMENT -------------------
+def percentile(samples, p):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * p / 100), len(samples) - 1)]
+
+
+def summarize(latencies, seconds, queries=None):
+    summary = {
+        "n": len(latencies),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "rps": round(len(latencies) / seconds, 1) if seconds else 0.0,
+    }
+    if queries is not None:
+        summary["queries"] = round(sum(queries) / max(len(queries), 1), 2)
+    return summary
+
+
+_counter = threading.local()
+
+
+def count_queries(db):
+    """Count statements on every pooled connection opened from now on."""
+    original = db.ConnectionPool._connect
+
+    def _connect(self):
+        conn = original(self)
+        conn.set_trace_callback(
+            lambda sql: setattr(_counter, "n", getattr(_counter, "n", 0) + 1)
+        )
+        return conn
+
+    db.ConnectionPool._connect = _connect
+
+
+# ------------------- ROUTES -------------------
+def route_specs(routes, rng, n_classes, n_jobs):
+    """(name, method, path or path(i), options) for every route worth timing.
+
+    options: "as" picks the session (user/admin), "data" builds form data,
+    "json" a JSON body, and "writes" marks routes that change the catalog.
+    """
+    terms = [
+        "ma",
+        "math",
+        "eng",
+        "physic",
+        "chem",
+        "teach",
+        "devel",
+        "xyz",
+        "mathemtics",
+    ]
+    avatar_bytes = (ROOT / "static/images/hei_tuna.jpg").read_bytes()
+    classes_csv = "name,year,is_mandatory,prerequisites\n" + "".join(
+        f"Bench Upload {i},{9 + i % 5},0,\n" for i in range(50)
+    )
+    jobs_csv = "name,salary_avg,area\n" + "".join(
+        f"Bench Job {i},{50000 + i},Science\n" for i in range(50)
+    )
+
+    def upload(content, name):
+        return lambda i: {"file": (BytesIO(content), name)}
+
+    def some_class(i):
+        return rng.randrange(n_classes) + 1
+
+    def some_job(i):
+        return rng.randrange(n_jobs) + 1
+
+    def salary_band(i):
+        low = rng.randrange(40_000, 120_000, 1000)
+        return f"min_salary={low}&max_salary={low + 40_000}"
+
+    def deep_cursor(i):
+        # Somewhere past the first few pages, as if the user kept scrolling
+        return f"{rng.randrange(80_000, 160_000, 1000)}:{some_job(i)}"
+
+    return [
+        ("home", "GET", "/", {}),
+        ("signup form", "GET", "/signup", {}),
+        (
+            "signup",
+            "POST",
+            "/signup",
+            {
+                "data": lambda i: {
+                    "username": f"b{i}",
+                    "password": "pw",
+                    "confirm_password": "pw",
+                    "email": f"{10000 + i}@burnside.school.nz",
+                    "code": str(10000 + i),
+                },
+                "slow": True,
+            },
+        ),
+        ("login form", "GET", "/login", {}),
+        (
+            "login",
+            "POST",
+            "/login",
+            {
+                "data": lambda i: {"username": "bench", "password": "bench"},
+                "slow": True,
+            },
+        ),
+        ("account", "GET", "/account", {"as": "user"}),
+        (
+            "account upload",
+            "POST",
+            "/account",
+            {"as": "user", "data": upload(avatar_bytes, "me.jpg")},
+        ),
+        ("avatar", "GET", "avatar", {"as": "user"}),
+        ("logout", "GET", "/logout", {"as": "user"}),
+        ("admin", "GET", "/admin", {"as": "admin"}),
+        ("admin filtered", "GET", "/admin?name=math&year=11", {"as": "admin"}),
+        ("admin outbox", "GET", "/admin/outbox", {"as": "admin"}),
+        (
+            "update classes",
+            "POST",
+            "/update-classes",
+            {
+                "as": "admin",
+                "data": upload(classes_csv.encode(), "bench_classes.csv"),
+                "writes": True,
+            },
+        ),
+        (
+            "update jobs",
+            "POST",
+            "/update-jobs",
+            {
+                "as": "admin",
+                "data": upload(jobs_csv.encode(), "bench_jobs.csv"),
+                "writes": True,
+            },
+        ),
+        (
+            "import job classes",
+            "GET",
+            "/import-job-classes",
+            {"as": "admin", "writes": True},
+        ),
+        (
+            "import bulk jobs",
+            "GET",
+            "/import-bulk-jobs",
+            {"as": "admin", "writes": True},
+        ),
+        ("import list", "GET", "/admin/imports", {"as": "admin"}),
+        # Every write spec above queued at least one import, so job 1 exists
+        ("import status", "GET", "/admin/imports/1", {"as": "admin"}),
+        # Each published import left a snapshot of the catalog it replaced
+        ("catalog snapshots", "GET", "/admin/snapshots", {"as": "admin"}),
+        (
+            "rollback",
+            "POST",
+            "/admin/rollback",
+            {"as": "admin", "data": lambda i: {}, "writes": True},
+        ),
+        (
+            "add job to class",
+            "POST",
+            lambda i: f"/add-job-to-class/{some_class(i)}/{some_job(i)}",
+            {"as": "admin", "writes": True},
+        ),
+        (
+            "remove job from class",
+            "POST",
+            lambda i: f"/remove-job-from-class/{some_class(i)}/{some_job(i)}",
+            {"as": "admin", "writes": True},
+        ),
+        ("subject page", "GET", "/subject", {}),
+        (
+            "subject search",
+            "GET",
+            lambda i: f"/subject-search?term={terms[i % len(terms)]}",
+            {},
+        ),
+        # Signed in, so remember_search queues the term for the history
+        # flush; the difference from the line above is what that costs
+        (
+            "subject search signed in",
+            "GET",
+            lambda i: f"/subject-search?term={terms[i % len(terms)]}",
+            {"as": "user"},
+        ),
+        ("search history", "GET", "/search-history", {"as": "user"}),
+        (
+            "record search",
+            "POST",
+            "/search-history",
+            {"as": "user", "data": lambda i: {"term": terms[i % len(terms)]}},
+        ),
+        (
+            "subject search post",
+            "POST",
+            "/subject-search",
+            {"json": lambda i: {"term": terms[i % len(terms)]}},
+        ),
+        (
+            "search results",
+            "GET",
+            lambda i: f"/subject-search/results?term={terms[i % len(terms)]}&page={1 + i % 3}",
+            {},
+        ),
+        ("subject by id", "GET", lambda i: f"/subject/{some_class(i)}", {}),
+        ("subject by job", "GET", lambda i: f"/subject/job/{some_job(i)}", {}),
+        ("browse jobs", "GET", "/jobs/browse", {}),
+        (
+            "browse filtered",
+            "GET",
+            lambda i: f"/jobs/browse?area={rng.choice(JOB_AREAS)}&{salary_band(i)}",
+            {},
+        ),
+        (
+            "browse deep cursor",
+            "GET",
+            lambda i: f"/jobs/browse?after={deep_cursor(i)}&per_page=100",
+            {},
+        ),
+        (
+            "browse filtered deep",
+            "GET",
+            lambda i: f"/jobs/browse?area={rng.choice(JOB_AREAS)}&{salary_band(i)}"
+            f"&after={deep_cursor(i)}",
+            {},
+        ),
+        ("job facets", "GET", lambda i: f"/jobs/facets?{salary_band(i)}", {}),
+        (
+            "job facets by area",
+            "GET",
+            lambda i: f"/jobs/facets?area={rng.choice(JOB_AREAS)}",
+            {},
+        ),
+        ("job pathway", "GET", lambda i: f"/pathway/job/{some_job(i)}", {}),
+        (
+            "coverage x100",
+            "POST",
+            "/coverage",
+            {
+                "json": lambda i: {
+                    "selections": [
+                        [some_class(i) for _ in range(6)] for _ in range(100)
+                    ]
+                }
+            },
+        ),
+        ("catalog bundle", "GET", lambda i: routes_bundle_url(routes), {}),
+        (
+            "class suggestions",
+            "GET",
+            lambda i: f"/class-suggestions?term={terms[i % len(terms)]}",
+            {},
+        ),
+        ("verify", "GET", lambda i: f"/verify/{rng.randrange(10**9, 10**12)}", {}),
+        ("test boundary", "GET", lambda i: f"/test-boundary/user{i % 100}", {}),
+        ("search not found", "GET", "/search_doesnt_exist", {}),
+        ("not found", "GET", "/no-such-page", {}),
+        (
+            "export links csv",
+            "GET",
+            "/admin/export/job_classes.csv",
+            {"as": "admin"},
+        ),
+        ("export jobs ndjson", "GET", "/admin/export/jobs.ndjson", {"as": "admin"}),
+        ("metrics", "GET", "/metrics", {}),
+    ]
+
+
+def routes_bundle_url(routes):
+    return f"/catalog/{routes.get_catalog(routes.DB_PATH).version}.json"
+
+
+def uncovered(app, specs):
+    """Routes no spec reaches, so new ones don't silently go unmeasured."""
+    from werkzeug.exceptions import HTTPException
+
+    adapter = app.url_map.bind("localhost")
+    reached = set()
+    for _, method, path, _ in specs:
+        if path == "avatar":
+            path = "/avatar/" + "0" * 64
+        elif callable(path):
+            path = path(0)
+        try:
+            reached.add(adapter.match(path.split("?")[0], method)[0])
+        except HTTPException:
+            pass
+    return sorted(
+        rule.rule
+        for rule in app.url_map.iter_rules()
+        if rule.endpoint != "static" and rule.endpoint not in reached
+    )
+
+
+def client_for(app, who):
+    client = app.test_client()
+    if who is not None:
+        code = ADMIN_CODE if who == "admin" else "99999"
+        with client.session_transaction() as session:
+            session["username"] = who if who == "admin" else "bench"
+            session["code"] = code
+    return client
+
+
+def run_test_client(routes, specs, iterations, write_iterations, slow_iterations):
+    """Time each route sequentially, counting SQL statements per request."""
+    app = routes.app
+    clients = {who: client_for(app, who) for who in (None, "user", "admin")}
+    results = {}
+    avatar_path = None
+    for name, method, path, options in specs:
+        client = clients[options.get("as")]
+        if options.get("slow"):
+            n = slow_iterations
+        elif options.get("writes"):
+            n = write_iterations
+        else:
+            n = iterations
+        latencies, queries, statuses = [], [], {}
+        started = time.perf_counter()
+        for i in range(n):
+            if path == "avatar":
+                url = avatar_path or "/avatar/" + "0" * 64
+            else:
+                url = path(i) if callable(path) else path
+            kwargs = {}
+            if "data" in options:
+                kwargs["data"] = options["data"](i)
+            if "json" in options:
+                kwargs["json"] = options["json"](i)
+            if name == "logout":
+                # Logging out clears the session; put it back for the next one
+                clients["user"] = client = client_for(app, "user")
+            _counter.n = 0
+            start = time.perf_counter()
+            response = client.open(url, method=method, **kwargs)
+            response.get_data()
+            latencies.append((time.perf_counter() - start) * 1000)
+            queries.append(_counter.n)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if name == "account upload":
+                with client.session_transaction() as session:
+                    avatar_path = f"/avatar/{session.get('pfp')}"
+        if name == "logout":
+            # Later specs need the user signed in again
+            clients["user"] = client_for(app, "user")
+        results[name] = summarize(latencies, time.perf_counter() - started, queries)
+        results[name]["status"] = statuses
+    return results
+
+
+# ------------------- HTTP LOAD -------------------
+def serve(app):
+    from werkzeug.serving import make_server
+
+    # One log line per request would drown the results
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_http(server, paths, threads, seconds):
+    """Hit paths from many keep-alive connections at once for seconds."""
+    host, port = server.server_address[:2]
+    stop = time.perf_counter() + seconds
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+
+    def loop(seed):
+        rng = random.Random(seed)
+        conn = http.client.HTTPConnection(host, port, timeout=30)
+        mine = []
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            try:
+                conn.request(
+                    "GET", rng.choice(paths), headers={"Accept-Encoding": "gzip"}
+                )
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 400:
+                    errors[0] += 1
+                if response.will_close:
+                    conn.close()
+                    conn = http.client.HTTPConnection(host, port, timeout=30)
+            except (OSError, http.client.HTTPException):
+                errors[0] += 1
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=30)
+                continue
+            mine.append((time.perf_counter() - start) * 1000)
+        conn.close()
+        with lock:
+            latencies.extend(mine)
+
+    workers = [threading.Thread(target=loop, args=(seed,)) for seed in range(threads)]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    summary = summarize(latencies, time.perf_counter() - started)
+    summary["errors"] = errors[0]
+    return summary
+
+
+def http_paths(routes, rng, n_classes, n_jobs):
+    terms = ["ma", "math", "eng", "physic", "chem", "teach", "devel", "des", "art"]
+    return {
+        "class suggestions": [f"/class-suggestions?term={t}" for t in terms],
+        "subject search": [f"/subject-search?term={t}" for t in terms],
+        "subject by id": [
+            f"/subject/{rng.randrange(n_classes) + 1}" for _ in range(200)
+        ],
+        "subject by job": [
+            f"/subject/job/{rng.randrange(n_jobs) + 1}" for _ in range(200)
+        ],
+        "catalog bundle": [routes_bundle_url(routes)],
+        "home": ["/"],
+    }
+
+
+# ------------------- ONE SCALE -------------------
+def run_scale(args):
+    """Benchmark one catalog size; runs in its own process so routes sees a fresh DB_PATH."""
+    tmp = tempfile.mkdtemp(prefix="bench_routes_")
+    try:
+        db_path = os.path.join(tmp, "main.db")
+        os.environ["DB_PATH"] = db_path
+        os.environ["AVATAR_FOLDER"] = os.path.join(tmp, "avatars")
+        sys.path.insert(0, str(ROOT))
+        rng = random.Random(SEED)
+
+        started = time.perf_counter()
+        n_classes, n_jobs, n_links = make_catalog(db_path, args.scale, args.links, rng)
+        generated = time.perf_counter() - started
+
+        from exports import round_trip
+
+        problems = round_trip(db_path)
+        if problems:
+            raise SystemExit(f"export round trip failed: {'; '.join(problems)}")
+        print("exports import back in unchanged")
+
+        import db
+
+        # The check's connections were opened before counting started
+        db.close_pools()
+        count_queries(db)
+        import routes
+
+        app = routes.init_app()
+        app.secret_key = app.secret_key or "bench"
+        # Never talk to the real mail relay; the outbox still does its work
+        app.config["MAIL_SUPPRESS_SEND"] = True
+        app.config["MAIL_USERNAME"] = app.config["MAIL_USERNAME"] or "bench@example.com"
+        # Uploads are spooled straight to the import runner and the bulk
+        # import routes only read static/data, so the real folder is safe
+
+        started = time.perf_counter()
+        routes.get_catalog(db_path)
+        loaded = time.perf_counter() - started
+        print(
+            f"\n{n_classes} classes, {n_jobs} jobs, {n_links} links "
+            f"(generated in {generated:.1f}s, catalog loaded in {loaded * 1000:.0f} ms)"
+        )
+
+        specs = route_specs(routes, rng, n_classes, n_jobs)
+        missing = uncovered(app, specs)
+        if missing:
+            print(f"not benchmarked: {', '.join(missing)}")
+
+        records = []
+        meta = {
+            "commit": args.commit,
+            "time": args.started,
+            "python": sys.version.split()[0],
+            "cpus": os.cpu_count(),
+            "classes": n_classes,
+            "jobs": n_jobs,
+            "links": n_links,
+        }
+        results = run_test_client(
+            routes, specs, args.iterations, args.write_iterations, args.slow_iterations
+        )
+        print(
+            f"{'test client':<24}{'p50':>9}{'p95':>9}{'p99':>9}{'req/s':>9}{'queries':>9}"
+        )
+        for name, r in results.items():
+            print(
+                f"{name:<24}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}"
+                f"{r['rps']:>9.0f}{r['queries']:>9.1f}"
+            )
+            records.append({**meta, "phase": "client", "route": name, **r})
+
+        if args.seconds > 0:
+            server = serve(app)
+            print(
+                f"{f'http, {args.threads} threads':<24}{'p50':>9}{'p95':>9}{'p99':>9}{'req/s':>9}{'errors':>9}"
+            )
+            for name, paths in http_paths(routes, rng, n_classes, n_jobs).items():
+                r = run_http(server, paths, args.threads, args.seconds)
+                print(
+                    f"{name:<24}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}"
+                    f"{r['rps']:>9.0f}{r['errors']:>9}"
+                )
+                records.append(
+                    {
+                        **meta,
+                        "phase": "http",
+                        "threads": args.threads,
+                        "route": name,
+                        **r,
+                    }
+                )
+            server.shutdown()
+
+        with open(args.out, "a") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+# ------------------- COMPARISON -------------------
+def compare(out, commit, baseline):
+    """Print p50/p95 of this run's records next to the latest run of baseline."""
+    latest = {}
+    current = {}
+    with open(out) as f:
+        for line in f:
+            record = json.loads(line)
+            key = (record["classes"], record["phase"], record["route"])
+            if record["commit"] == commit:
+                current[key] = record
+            elif record["commit"].startswith(baseline):
+                latest[key] = record
+    if not latest:
+        print(f"\nno results for {baseline} in {out}")
+        return
+    print(f"\nagainst {baseline}: p50 and p95 change (negative is faster)")
+    for key, record in sorted(current.items()):
+        old = latest.get(key)
+        if old is None:
+            continue
+        changes = [
+            f"{(record[p] - old[p]) / old[p] * 100:+6.0f}%" if old[p] else "    n/a"
+            for p in ("p50_ms", "p95_ms")
+        ]
+        print(f"{key[0]:>8} {key[1]:<7}{key[2]:<24}{'  '.join(changes)}")
+
+
+# ------------------- MAIN -------------------
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--scales", default="1000,10000", help="class counts, comma separated"
+    )
+    parser.add_argument(
+        "--links",
+        type=int,
+        default=None,
+        help="links per scale (default 10 per class, max 1M)",
+    )
+    parser.add_argument(
+        "--iterations", type=int, default=200, help="requests per read route"
+    )
+    parser.add_argument(
+        "--write-iterations",
+        type=int,
+        default=10,
+        help="requests per catalog write route",
+    )
+    parser.add_argument(
+        "--slow-iterations",
+        type=int,
+        default=5,
+        help="requests per password hashing route",
+    )
+    parser.add_argument("--threads", type=int, default=16, help="HTTP load threads")
+    parser.add_argument(
+        "--seconds", type=float, default=3, help="HTTP load per route, 0 to skip"
+    )
+    parser.add_argument("--out", default=str(RESULTS))
+    parser.add_argument("--compare", metavar="REV", help="commit to compare against")
+    parser.add_argument("--scale", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--commit", help=argparse.SUPPRESS)
+    parser.add_argument("--started", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scale is not None:
+        run_scale(args)
+        return
+
+    commit = current_commit()
+    started = time.strftime("%Y-%m-%dT%H:%M:%S")
+    for scale in (int(s) for s in args.scales.split(",")):
+        links = args.links if args.links is not None else min(scale * 10, 1_000_000)
+        subprocess.run(
+            [
+                sys.executable,
+                __file__,
+                f"--scale={scale}",
+                f"--links={links}",
+                f"--iterations={args.iterations}",
+                f"--write-iterations={args.write_iterations}",
+                f"--slow-iterations={args.slow_iterations}",
+                f"--threads={args.threads}",
+                f"--seconds={args.seconds}",
+                f"--out={args.out}",
+                f"--commit={commit}",
+                f"--started={started}",
+            ],
+            check=True,
+        )
+    if args.compare:
+        compare(args.out, commit, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+# ------------------- IMPORTS -------------------
+import gzip
+import json
+
+from httpcache import PACKED_BROTLI_QUALITY, PACKED_GZIP_LEVEL, brotli
+
+
+# ------------------- BUNDLE -------------------
+class CatalogBundle:
+    """The whole catalog as one compact JSON document, compressed up front.
+
+        {"version": 7,
+         "classes": [[id, name, year, is_mandatory, [job_id, ...]], ...],
+         "jobs": [[id, name], ...]}
+
+    Both lists are in name order, the order server-side search uses.
+    """
+
+    def __init__(self, catalog):
+        self.version = catalog.version
+        document = {
+            "version": catalog.version,
+            "classes": [
+                [
+                    c.id,
+                    c.name,
+                    c.year,
+                    int(bool(c.is_mandatory)),
+                    list(catalog.jobs_by_class.get(c.id, ())),
+                ]
+                for c in catalog.classes_by_name
+            ],
+            "jobs": [[j.id, j.name] for j in catalog.jobs_by_name],
+        }
+        self.identity = json.dumps(
+            document, separators=(",", ":"), ensure_ascii=False
+        ).encode()
+        self.encodings = {
+            "gzip": gzip.compress(self.identity, PACKED_GZIP_LEVEL, mtime=0)
+        }
+        if brotli is not None:
+            self.encodings["br"] = brotli.compress(
+                self.identity, quality=PACKED_BROTLI_QUALITY
+            )
+
+    def body(self, encoding):
+        """Bytes to send for a Content-Encoding (None for uncompressed)."""
+        return self.encodings.get(encoding, self.identity)
@@ -0,0 +1,322 @@
+# ------------------- IMPORTS -------------------
+from collections import namedtuple
+from functools import cached_property
+from itertools import islice
+from types import MappingProxyType
+import os
+import threading
+import time
+
+from bundle import CatalogBundle
+from db import connect
+from facets import JobFacets
+from metrics import report_error
+from prereqs import PrerequisiteGraph
+from suggest import SuggestionCache, SuggestionIndex
+
+# ------------------- CONSTANTS -------------------
+# How often a process asks the database whether someone else changed the
+# catalog: other workers, or the import scripts run from a shell
+CHECK_INTERVAL = float(os.getenv("CATALOG_CHECK_SECONDS", "1"))
+
+# ------------------- RECORDS -------------------
+ClassRow = namedtuple("ClassRow", "id name year is_mandatory prerequisites")
+JobRow = namedtuple("JobRow", "id name salary_avg area")
+
+
+def class_dict(c):
+    return {
+        "id": c.id,
+        "name": c.name,
+        "year": c.year,
+        "is_mandatory": bool(c.is_mandatory),
+    }
+
+
+def job_dict(j):
+    return {"id": j.id, "name": j.name}
+
+
+# ------------------- SNAPSHOT -------------------
+class Catalog:
+    """Read-only snapshot of classes, jobs and the links between them."""
+
+    def __init__(self, classes, jobs, links, version=0, updated_at=0.0):
+        self.version = version
+        self.updated_at = updated_at
+        self.classes = MappingProxyType({c.id: c for c in classes})
+        self.jobs = MappingProxyType({j.id: j for j in jobs})
+
+        jobs_by_class = {}
+        classes_by_job = {}
+        for class_id, job_id in links:
+            # Dangling rows in job_classes never showed up through the joins
+            if class_id not in self.classes or job_id not in self.jobs:
+                continue
+            jobs_by_class.setdefault(class_id, []).append(job_id)
+            classes_by_job.setdefault(job_id, []).append(class_id)
+        self.jobs_by_class = MappingProxyType(
+            {k: tuple(v) for k, v in jobs_by_class.items()}
+        )
+        self.classes_by_job = MappingProxyType(
+            {k: tuple(v) for k, v in classes_by_job.items()}
+        )
+
+        # Same orderings the old "ORDER BY name" queries produced
+        self.classes_by_name = tuple(
+            sorted(
+                self.classes.values(), key=lambda c: (c.name or "", c.year or 0, c.id)
+            )
+        )
+        self.jobs_by_name = tuple(
+            sorted(self.jobs.values(), key=lambda j: (j.name or "", j.id))
+        )
+        self.class_positions = MappingProxyType(
+            {c.id: i for i, c in enumerate(self.classes_by_name)}
+        )
+        # Built with every snapshot, so a changed prerequisite is picked up
+        # by the same refresh that follows add_class or an import
+        self.prerequisites = PrerequisiteGraph(self.classes_by_name)
+        # Same for the job browser's orderings and facet counts
+        self.facets = JobFacets(self.jobs_by_name)
+
+        self._suggestions = None
+        self._suggestion_cache = None
+        # The previous snapshot's answers, used while our own index builds
+        self._stand_in = None
+        self._suggestions_lock = threading.Lock()
+
+    @cached_property
+    def names(self):
+        """Every class and job name: all the search box indexes."""
+        return frozenset(c.name for c in self.classes.values()) | frozenset(
+            j.name for j in self.jobs.values()
+        )
+
+    @property
+    def suggestions(self):
+        """Search-box index over every class and job name, built on first use."""
+        index = self._suggestions
+        if index is None:
+            with self._suggestions_lock:
+                if self._suggestions is None:
+                    self._suggestions = SuggestionIndex(self.names)
+                    self._stand_in = None
+                index = self._suggestions
+        return index
+
+    @property
+    def suggestion_cache(self):
+        """Recent search-box answers for this snapshot's index.
+
+        While follow() is building the index in the background, the
+        previous snapshot's cache answers instead.
+        """
+        cache = self._suggestion_cache
+        if cache is None:
+            stand_in = self._stand_in
+            if stand_in is not None and self._suggestions is None:
+                return stand_in
+            index = self.suggestions
+            with self._suggestions_lock:
+                if self._suggestion_cache is None:
+                    self._suggestion_cache = SuggestionCache(index)
+                cache = self._suggestion_cache
+        return cache
+
+    def follow(self, previous):
+        """Take over what previous built for search, instead of a request doing it.
+
+        Most catalog changes are link edits that rename nothing, so the
+        index and its cached answers carry straight over. Otherwise the
+        new index builds on a background thread. A snapshot whose
+        predecessor never built one stays lazy.
+        """
+        if previous is None:
+            return
+        if previous._suggestions is None and previous._stand_in is None:
+            return
+        same_names = previous.names == self.names
+        if same_names and previous._suggestions is not None:
+            self._suggestions = previous._suggestions
+            self._suggestion_cache = previous.suggestion_cache
+            return
+        self._stand_in = previous.suggestion_cache
+        threading.Thread(
+            target=self._build_suggestions,
+            args=(previous if same_names else None,),
+            name="suggestion-index",
+            daemon=True,
+        ).start()
+
+    def _build_suggestions(self, same_names_as=None):
+        try:
+            with self._suggestions_lock:
+                if self._suggestions is not None:
+                    return
+                if same_names_as is not None:
+                    # Still building its own; ours would come out the same
+                    self._suggestion_cache = same_names_as.suggestion_cache
+                    self._suggestions = same_names_as.suggestions
+                else:
+                    self._suggestions = SuggestionIndex(self.names)
+        except Exception as e:
+            report_error("suggestion-index", e)
+        finally:
+            # From here on requests use, or build, this snapshot's own index
+            self._stand_in = None
+
+    def relinked(self, class_id, job_id, linked, version, updated_at):
+        """Copy of this snapshot with one class-job link added or removed.
+
+        Only the two link maps change; the orderings, prerequisites and
+        facets don't depend on links and are shared with this snapshot.
+        """
+        catalog = object.__new__(Catalog)
+        catalog.__dict__.update(self.__dict__)
+        # The bundle lists links; the names don't, so they carry over
+        catalog.__dict__.pop("bundle", None)
+        catalog.version = version
+        catalog.updated_at = updated_at
+        catalog._suggestions = None
+        catalog._suggestion_cache = None
+        catalog._stand_in = None
+        catalog._suggestions_lock = threading.Lock()
+        if class_id in self.classes and job_id in self.jobs:
+            catalog.jobs_by_class = _relink(
+                self.jobs_by_class, class_id, job_id, linked
+            )
+            catalog.classes_by_job = _relink(
+                self.classes_by_job, job_id, class_id, linked
+            )
+        return catalog
+
+    @cached_property
+    def bundle(self):
+        """Precompressed JSON of the whole snapshot for the browser."""
+        return CatalogBundle(self)
+
+    def classes_after(self, class_id=None):
+        """Classes in name order, starting just past class_id."""
+        start = self.class_positions.get(class_id, -1) + 1
+        return islice(self.classes_by_name, start, None)
+
+    def jobs_for_class(self, class_id):
+        return [self.jobs[j] for j in self.jobs_by_class.get(class_id, ())]
+
+    def classes_for_job(self, job_id):
+        return [self.classes[c] for c in self.classes_by_job.get(job_id, ())]
+
+    def match_classes(self, term):
+        """Classes whose name contains term (case-insensitive), by name."""
+        return (c for c in self.classes_by_name if term in (c.name or "").lower())
+
+    def match_jobs(self, term):
+        """Jobs whose name contains term (case-insensitive), by name."""
+        return (j for j in self.jobs_by_name if term in (j.name or "").lower())
+
+
+def _relink(links, key, value, linked):
+    values = tuple(v for v in links.get(key, ()) if v != value)
+    if linked:
+        # A new row has the highest id, so it goes last as ORDER BY id has it
+        values += (value,)
+    links = dict(links)
+    if values:
+        links[key] = values
+    else:
+        links.pop(key, None)
+    return MappingProxyType(links)
+
+
+def load_catalog(db_path):
+    """Read the whole catalog and its version in one read transaction."""
+    with connect(db_path, readonly=True) as conn:
+        cursor = conn.cursor()
+        # Keeps the version in step with the rows even if an import commits
+        # halfway through; the pool rolls the transaction back afterwards
+        cursor.execute("BEGIN")
+        cursor.execute("SELECT version, updated_at FROM catalog_version")
+        version, updated_at = cursor.fetchone()
+        cursor.execute(
+            "SELECT id, name, year, is_mandatory, prerequisites FROM classes"
+        )
+        classes = [ClassRow(*row) for row in cursor.fetchall()]
+        cursor.execute("SELECT id, name, salary_avg, area FROM jobs")
+        jobs = [JobRow(*row) for row in cursor.fetchall()]
+        cursor.execute("SELECT class_id, job_id FROM job_classes ORDER BY id")
+        links = cursor.fetchall()
+    return Catalog(classes, jobs, links, version, updated_at)
+
+
+def bump_catalog_version(conn):
+    """Mark the catalog as changed, inside the transaction that changed it.
+
+    Returns the new (version, updated_at).
+    """
+    conn.execute(
+        "UPDATE catalog_version SET version = version + 1, updated_at = ?",
+        (time.time(),),
+    )
+    return conn.execute("SELECT version, updated_at FROM catalog_version").fetchone()
+
+
+# ------------------- PUBLISHING -------------------
+_current = None
+_checked = 0.0
+_lock = threading.Lock()
+
+
+def get_catalog(db_path):
+    """Current snapshot, loaded on first use and reloaded once it is stale."""
+    global _checked
+    catalog = _current
+    if catalog is None:
+        with _lock:
+            if _current is None:
+                _publish(load_catalog(db_path))
+            catalog = _current
+    elif time.monotonic() - _checked >= CHECK_INTERVAL:
+        # Whoever gets here first checks; everyone else keeps the snapshot
+        _checked = time.monotonic()
+        if catalog_version(db_path) != catalog.version:
+            with _lock:
+                if _current is catalog:
+                    _publish(load_catalog(db_path))
+                catalog = _current
+    return catalog
+
+
+def catalog_version(db_path):
+    with connect(db_path, readonly=True) as conn:
+        return conn.execute("SELECT version FROM catalog_version").fetchone()[0]
+
+
+def refresh_catalog(db_path):
+    """Reload from the database and swap the new snapshot in atomically."""
+    with _lock:
+        _publish(load_catalog(db_path))
+    return _current
+
+
+def publish_link(db_path, class_id, job_id, linked, version, updated_at):
+    """Publish a committed one-link change without reloading the catalog.
+
+    version is what the change bumped the database to. If the current
+    snapshot isn't the one just before it, another write came in between
+    and the catalog is reloaded instead.
+    """
+    with _lock:
+        catalog = _current
+        if catalog is not None and catalog.version == version - 1:
+            _publish(catalog.relinked(class_id, job_id, linked, version, updated_at))
+        elif catalog is None or catalog.version < version:
+            _publish(load_catalog(db_path))
+    return _current
+
+
+def _publish(catalog):
+    global _current, _checked
+    catalog.follow(_current)
+    _current = catalog
+    _checked = time.monotonic()
@@ -0,0 +1,46 @@
+# ------------------- IMPORTS -------------------
+from collections import Counter
+from heapq import nsmallest
+from itertools import filterfalse
+
+# ------------------- CONSTANTS -------------------
+DEFAULT_LIMIT = 20
+
+
+# ------------------- SCORING -------------------
+def score_selection(catalog, class_ids, limit=DEFAULT_LIMIT):
+    """Jobs a selection covers at least partly, best coverage first.
+
+    Counting the selected classes' links gives each job's coverage
+    directly; only jobs the selection touches are ever looked at.
+    """
+    selected = {c for c in class_ids if isinstance(c, int) and c in catalog.classes}
+    counts = Counter()
+    for class_id in selected:
+        counts.update(catalog.jobs_by_class.get(class_id, ()))
+
+    full = 0
+    candidates = []
+    for job_id, covered in counts.items():
+        size = len(catalog.classes_by_job[job_id])
+        if covered == size:
+            full += 1
+        # Negated so the smallest tuples are the best covered jobs
+        candidates.append((-covered / size, -covered, job_id, size))
+
+    jobs = []
+    for ratio, covered, job_id, size in nsmallest(limit, candidates):
+        ratio, covered = -ratio, -covered
+        jobs.append(
+            {
+                "id": job_id,
+                "name": catalog.jobs[job_id].name,
+                "covered": covered,
+                "total": size,
+                "ratio": round(ratio, 3),
+                "missing": list(
+                    filterfalse(selected.__contains__, catalog.classes_by_job[job_id])
+                ),
+            }
+        )
+    return {"full": full, "partial": len(counts) - full, "jobs": jobs}
@@ -0,0 +1,152 @@
+# ------------------- IMPORTS -------------------
+from contextlib import contextmanager
+from pathlib import Path
+import queue
+import sqlite3
+import threading
+import time
+
+from metrics import record_query
+
+# ------------------- CONSTANTS -------------------
+POOL_SIZE = 8
+CACHED_STATEMENTS = 256
+PRAGMAS = [
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA temp_store=MEMORY",
+]
+
+
+# ------------------- INSTRUMENTATION -------------------
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that reports every statement and how long it took to metrics."""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            record_query(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            record_query(sql, time.perf_counter() - start)
+
+
+class TimedConnection(sqlite3.Connection):
+    # sqlite3's own Connection.execute skips Cursor.execute, so route it through
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+# ------------------- POOL -------------------
+class ConnectionPool:
+    """Reusable, pre-tuned connections to one database file.
+
+    Connections outlive requests, so their PRAGMAs and the sqlite3 module's
+    per-connection prepared statement cache are paid for once. Idle
+    connections are handed out newest first; extras beyond size are closed.
+    """
+
+    def __init__(self, db_path, readonly=False, size=POOL_SIZE):
+        self.db_path = db_path
+        self.readonly = readonly
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def _connect(self):
+        if self.readonly:
+            uri = Path(self.db_path).resolve().as_uri() + "?mode=ro"
+            conn = sqlite3.connect(
+                uri,
+                uri=True,
+                check_same_thread=False,
+                cached_statements=CACHED_STATEMENTS,
+                factory=TimedConnection,
+            )
+        else:
+            conn = sqlite3.connect(
+                self.db_path,
+                check_same_thread=False,
+                cached_statements=CACHED_STATEMENTS,
+                factory=TimedConnection,
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def release(self, conn):
+        # Never hand the next user someone else's half-finished transaction
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close(self):
+        """Close every idle connection."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+
+_pools = {}
+_lock = threading.Lock()
+
+
+def get_pool(db_path, readonly=False):
+    key = (db_path, readonly)
+    pool = _pools.get(key)
+    if pool is None:
+        with _lock:
+            pool = _pools.setdefault(key, ConnectionPool(db_path, readonly))
+    return pool
+
+
+def close_pools(db_path=None):
+    """Drop pooled connections to db_path, or to every file.
+
+    A SQLite connection must never be used from two processes, so this runs
+    before forking workers; forked children then open their own.
+    """
+    with _lock:
+        keys = [k for k in _pools if db_path is None or k[0] == db_path]
+        pools = [_pools.pop(k) for k in keys]
+    for pool in pools:
+        pool.close()
+
+
+def connect(db_path, readonly=False):
+    """Borrow a pooled connection: `with connect(path) as conn:`.
+
+    Like sqlite3.connect, wrap the connection in `with conn:` to commit.
+    """
+    return get_pool(db_path, readonly).connection()
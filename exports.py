@@ -0,0 +1,197 @@
+# ------------------- IMPORTS -------------------
+from itertools import groupby
+from operator import itemgetter
+import csv
+import io
+import json
+import os
+import sqlite3
+import tempfile
+
+from db import close_pools, connect
+from importer import import_csv
+from migrations import migrate
+
+# ------------------- CONSTANTS -------------------
+# Output is handed to the server in pieces of about this many characters
+CHUNK_SIZE = 64 * 1024
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+# The header each CSV starts with; every one reads back in through import_csv.
+# job_classes is the all_high_school_classes.csv layout that
+# add_job_classes_from_file takes, one row per class with its jobs listed
+CSV_COLUMNS = {
+    "classes": ["id", "name", "year", "is_mandatory", "prerequisites"],
+    "jobs": ["id", "name", "salary_avg", "area"],
+    "job_classes": [
+        "class_id",
+        "name",
+        "year",
+        "is_mandatory",
+        "prerequisites",
+        "jobs",
+    ],
+}
+
+
+# ------------------- RECORDS -------------------
+def _classes(cursor):
+    cursor.execute(
+        "SELECT id, name, year, is_mandatory, prerequisites FROM classes ORDER BY id"
+    )
+    for class_id, name, year, is_mandatory, prerequisites in cursor:
+        yield {
+            "id": class_id,
+            "name": name,
+            "year": year,
+            "is_mandatory": bool(is_mandatory),
+            "prerequisites": prerequisites or "",
+        }
+
+
+def _jobs(cursor):
+    cursor.execute("SELECT id, name, salary_avg, area FROM jobs ORDER BY id")
+    for job_id, name, salary_avg, area in cursor:
+        yield {"id": job_id, "name": name, "salary_avg": salary_avg, "area": area}
+
+
+def _job_classes(cursor):
+    # Walks classes in id order and each one's links through job_classes_pair,
+    # so rows arrive grouped without SQLite sorting the whole join first
+    cursor.execute("""
+        SELECT c.id, c.name, c.year, c.is_mandatory, c.prerequisites, j.name
+        FROM classes c
+        LEFT JOIN job_classes jc ON jc.class_id = c.id
+        LEFT JOIN jobs j ON j.id = jc.job_id
+        ORDER BY c.id
+    """)
+    for _, rows in groupby(cursor, key=itemgetter(0)):
+        rows = list(rows)
+        class_id, name, year, is_mandatory, prerequisites, _ = rows[0]
+        yield {
+            "class_id": class_id,
+            "name": name,
+            "year": year,
+            "is_mandatory": bool(is_mandatory),
+            "prerequisites": prerequisites or "",
+            "jobs": [row[5] for row in rows if row[5]],
+        }
+
+
+READERS = {"classes": _classes, "jobs": _jobs, "job_classes": _job_classes}
+
+
+def records(db_path, table):
+    """Every row of a catalog table as a dict, read lazily off one cursor."""
+    with connect(db_path, readonly=True) as conn:
+        cursor = conn.cursor()
+        # One consistent catalog however long the download takes; the pool
+        # ends the transaction when the connection goes back
+        cursor.execute("BEGIN")
+        yield from READERS[table](cursor)
+
+
+# ------------------- FORMATS -------------------
+def _csv_value(value):
+    if isinstance(value, bool):
+        return "Yes" if value else "No"
+    if isinstance(value, list):
+        return "; ".join(value)
+    return "" if value is None else value
+
+
+def _csv_lines(table, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    columns = CSV_COLUMNS[table]
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    for row in rows:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow([_csv_value(row[column]) for column in columns])
+        yield buffer.getvalue()
+
+
+def _ndjson_lines(table, rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+def _chunks(lines):
+    """Join lines into CHUNK_SIZE pieces, sending the first line straight away."""
+    lines = iter(lines)
+    first = next(lines, None)
+    if first is None:
+        return
+    yield first
+    chunk = []
+    size = 0
+    for line in lines:
+        chunk.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield "".join(chunk)
+            chunk.clear()
+            size = 0
+    if chunk:
+        yield "".join(chunk)
+
+
+def export(db_path, table, fmt):
+    """Generator of text for table in fmt ("csv" or "ndjson").
+
+    Nothing is read until the first piece is asked for, and only a chunk
+    is ever held in memory, so it suits a streamed response of any size.
+    """
+    lines = _csv_lines if fmt == "csv" else _ndjson_lines
+    return _chunks(lines(table, records(db_path, table)))
+
+
+# ------------------- CHECKS -------------------
+# How each CSV is read back in. job_classes goes in as a class file, which
+# links on (name, year), because a fresh database numbers classes anew
+ROUND_TRIP = [("classes", "classes"), ("jobs", "jobs"), ("job_classes", "classes")]
+
+
+def _table_counts(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return {
+            table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("classes", "jobs", "job_classes")
+        }
+    finally:
+        conn.close()
+
+
+def round_trip(db_path):
+    """Export every table as CSV and import it into an empty database.
+
+    Returns the problems found: rows the importer rejected, or tables that
+    came back with a different number of rows. None means the exports are
+    a complete copy of the catalog.
+    """
+    problems = []
+    with tempfile.TemporaryDirectory(prefix="export-check-") as folder:
+        scratch = os.path.join(folder, "check.db")
+        migrate(scratch)
+        try:
+            for table, kind in ROUND_TRIP:
+                path = os.path.join(folder, f"{table}.csv")
+                with open(path, "w", encoding="utf-8", newline="") as f:
+                    f.writelines(export(db_path, table, "csv"))
+                with open(path, encoding="utf-8", newline="") as f:
+                    result = import_csv(scratch, f, kind)
+                if result.errors:
+                    line, message = result.errors[0]
+                    problems.append(
+                        f"{table}.csv: {len(result.errors)} bad rows (line {line}: {message})"
+                    )
+        finally:
+            close_pools(scratch)
+        expected = _table_counts(db_path)
+        found = _table_counts(scratch)
+    for table, count in expected.items():
+        if found[table] != count:
+            problems.append(f"{table}: {count} rows exported, {found[table]} imported")
+    return problems
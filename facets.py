@@ -0,0 +1,106 @@
+# ------------------- IMPORTS -------------------
+from bisect import bisect_left, bisect_right
+from types import MappingProxyType
+
+# ------------------- CONSTANTS -------------------
+SALARY_BUCKET = 10000
+# Jobs without a salary sort before every real one, and drop out of any
+# salary filter
+NO_SALARY = -1
+
+
+# ------------------- CURSORS -------------------
+def sort_key(job):
+    salary = job.salary_avg
+    return (salary if salary is not None else NO_SALARY, job.id)
+
+
+def encode_cursor(key):
+    return f"{key[0]}:{key[1]}"
+
+
+def decode_cursor(cursor):
+    """(salary, id) from an encode_cursor string; ValueError if it isn't one."""
+    salary, _, job_id = cursor.partition(":")
+    return (int(salary), int(job_id))
+
+
+def area_key(area):
+    return (area or "").strip().lower()
+
+
+# ------------------- FACETS -------------------
+class JobFacets:
+    """Jobs ordered by salary, overall and per area, with counts for each.
+
+    Built once per catalog snapshot, so filtering, paging and the facet
+    sidebar are binary searches over these lists rather than queries.
+    """
+
+    def __init__(self, jobs):
+        ordered = sorted(jobs, key=sort_key)
+        by_area = {}
+        names = {}
+        for job in ordered:
+            key = area_key(job.area)
+            if key:
+                by_area.setdefault(key, []).append(job)
+                names.setdefault(key, job.area.strip())
+        self._jobs = {None: ordered, **by_area}
+        self._keys = {
+            area: [sort_key(j) for j in area_jobs]
+            for area, area_jobs in self._jobs.items()
+        }
+        # Display spelling of each area, by the lowercase key used to look it up
+        self.areas = MappingProxyType(dict(sorted(names.items())))
+        self.histograms = MappingProxyType(
+            {area: _histogram(area_jobs) for area, area_jobs in self._jobs.items()}
+        )
+
+    def _range(self, area, min_salary, max_salary):
+        keys = self._keys.get(area, [])
+        if min_salary is None and max_salary is None:
+            start = 0
+        else:
+            # A salary filter never matches jobs without a salary
+            lowest = max(min_salary or 0, NO_SALARY + 1)
+            start = bisect_left(keys, (lowest,))
+        end = len(keys) if max_salary is None else bisect_left(keys, (max_salary + 1,))
+        return keys, start, max(start, end)
+
+    def area_counts(self, min_salary=None, max_salary=None):
+        """Jobs in each area within the salary range, largest area first."""
+        counts = []
+        for key, name in self.areas.items():
+            _, start, end = self._range(key, min_salary, max_salary)
+            if end > start:
+                counts.append({"area": name, "count": end - start})
+        counts.sort(key=lambda c: -c["count"])
+        return counts
+
+    def browse(self, area=None, min_salary=None, max_salary=None, after=None, limit=20):
+        """A page of jobs by salary then id, starting just past the after key.
+
+        Returns the jobs, the cursor for the next page (None on the last)
+        and how many jobs match altogether.
+        """
+        area = area_key(area) or None
+        keys, start, end = self._range(area, min_salary, max_salary)
+        first = start if after is None else max(start, bisect_right(keys, after))
+        last = min(first + limit, end)
+        jobs = self._jobs.get(area, [])[first:last]
+        next_cursor = encode_cursor(keys[last - 1]) if last < end else None
+        return {"jobs": jobs, "next": next_cursor, "total": end - start}
+
+
+def _histogram(jobs):
+    """Job counts per SALARY_BUCKET-wide salary band, lowest band first."""
+    counts = {}
+    for job in jobs:
+        if job.salary_avg is not None:
+            low = job.salary_avg // SALARY_BUCKET * SALARY_BUCKET
+            counts[low] = counts.get(low, 0) + 1
+    return tuple(
+        {"min": low, "max": low + SALARY_BUCKET - 1, "count": count}
+        for low, count in sorted(counts.items())
+    )
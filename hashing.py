@@ -0,0 +1,77 @@
+# ------------------- IMPORTS -------------------
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import os
+import threading
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# ------------------- CONSTANTS -------------------
+WORKERS = int(os.getenv("HASH_WORKERS", os.cpu_count() or 1))
+# Hashes allowed to be running or waiting at once before we turn people away
+MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", WORKERS * 4))
+TIMEOUT = 10
+
+
+# ------------------- POOL -------------------
+class HashingBusy(Exception):
+    """Too many hashes queued; the caller should ask the user to retry."""
+
+
+_executor = None
+_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(MAX_PENDING)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                # spawn, not fork: forking a threaded web server is unsafe
+                _executor = ProcessPoolExecutor(
+                    WORKERS, mp_context=multiprocessing.get_context("spawn")
+                )
+    return _executor
+
+
+def _reset_executor():
+    global _executor
+    with _lock:
+        _executor = None
+
+
+def _run(fn, *args):
+    if not _slots.acquire(blocking=False):
+        raise HashingBusy()
+    try:
+        future = _get_executor().submit(fn, *args)
+    except BrokenProcessPool:
+        _slots.release()
+        _reset_executor()
+        raise HashingBusy()
+    except BaseException:
+        _slots.release()
+        raise
+    # The slot comes back when the pool is done with the hash, not when we
+    # stop waiting, so the semaphore bounds the pool's real load
+    future.add_done_callback(lambda _: _slots.release())
+    try:
+        # Waiting on the future releases the GIL for the cheap routes
+        return future.result(timeout=TIMEOUT)
+    except BrokenProcessPool:
+        _reset_executor()
+        raise HashingBusy()
+    except TimeoutError:
+        # Still queued: drop it. Already running: it keeps its slot until done
+        future.cancel()
+        raise HashingBusy()
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password)
+
+
+def verify_password(pwhash, password):
+    return _run(check_password_hash, pwhash, password)
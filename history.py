@@ -0,0 +1,194 @@
+# ------------------- IMPORTS -------------------
+import threading
+import time
+
+from catalog import get_catalog
+from db import connect
+from worker import BackgroundWorker
+
+# ------------------- CONSTANTS -------------------
+FLUSH_INTERVAL = 2
+# A burst this big is flushed straight away instead of at the next interval
+FLUSH_BATCH = 1000
+# Past this many unwritten searches new ones are dropped rather than queued
+MAX_PENDING = 10000
+# Terms kept per user; older ones are deleted as new ones arrive
+HISTORY_SIZE = 20
+MAX_TERM_LENGTH = 100
+POPULAR_SIZE = 10
+POPULAR_HOURS = 7 * 24
+POPULAR_INTERVAL = 300
+# Only the most searched terms are matched up with catalog items
+POPULAR_TERMS = 500
+
+
+# ------------------- HELPERS -------------------
+def normalize_term(term):
+    return " ".join((term or "").lower().split())[:MAX_TERM_LENGTH]
+
+
+def popular_items(catalog, term_counts, size=POPULAR_SIZE):
+    """Add up (term, count) pairs per class or job, most searched first.
+
+    Each term counts towards its best suggestion, so "math" and "maths"
+    both count for Mathematics.
+    """
+    class_names = {c.name for c in catalog.classes.values()}
+    totals = {}
+    for term, count in term_counts:
+        names = catalog.suggestions.search(term, 1)
+        if names:
+            totals[names[0]] = totals.get(names[0], 0) + count
+    ranked = sorted(totals.items(), key=lambda item: (-item[1], item[0]))[:size]
+    return [
+        {
+            "name": name,
+            "kind": "class" if name in class_names else "job",
+            "searches": searches,
+        }
+        for name, searches in ranked
+    ]
+
+
+# ------------------- BUFFER -------------------
+class SearchHistory:
+    """Write-behind record of searches, flushed to SQLite by a background thread.
+
+    record() only appends to a list, so searching never waits on a write.
+    Every FLUSH_INTERVAL the thread writes what has built up in one
+    transaction: each user's latest HISTORY_SIZE terms, and hourly counts
+    that popular_searches is recomputed from every POPULAR_INTERVAL. A
+    process that dies loses the searches it hadn't flushed yet.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.dropped = 0
+        self._pending = []
+        self._lock = threading.Lock()
+        self._worker = BackgroundWorker("search-history", self._step, FLUSH_INTERVAL)
+        self._popular = []
+        self._popular_loaded = None
+        self._popular_checked = None
+
+    def start(self):
+        """Start the thread unless it is already running in this process."""
+        self._worker.start()
+
+    def record(self, username, term):
+        """Queue a signed-in user's search."""
+        term = normalize_term(term)
+        if not term:
+            return
+        with self._lock:
+            if len(self._pending) >= MAX_PENDING:
+                self.dropped += 1
+                return
+            self._pending.append((username, term, time.time()))
+            if len(self._pending) >= FLUSH_BATCH:
+                self._worker.wake()
+        self.start()
+
+    def _step(self):
+        self.flush()
+        self.update_popular()
+
+    def flush(self):
+        """Write buffered searches in one transaction; returns how many."""
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return 0
+        history = {}
+        counts = {}
+        for username, term, searched_at in batch:
+            count, _ = history.get((username, term), (0, 0))
+            history[(username, term)] = (count + 1, searched_at)
+            key = (term, int(searched_at // 3600))
+            counts[key] = counts.get(key, 0) + 1
+        try:
+            with connect(self.db_path) as conn, conn:
+                conn.executemany(
+                    "INSERT INTO search_history(username, term, count, searched_at) VALUES(?,?,?,?) ON CONFLICT(username, term) DO UPDATE SET count = count + excluded.count, searched_at = MAX(searched_at, excluded.searched_at)",
+                    [(u, t, c, at) for (u, t), (c, at) in history.items()],
+                )
+                conn.executemany(
+                    "INSERT INTO search_counts(term, hour, count) VALUES(?,?,?) ON CONFLICT(term, hour) DO UPDATE SET count = count + excluded.count",
+                    [(t, hour, c) for (t, hour), c in counts.items()],
+                )
+                conn.executemany(
+                    """
+                    DELETE FROM search_history WHERE username = ? AND term NOT IN (
+                        SELECT term FROM search_history WHERE username = ?
+                        ORDER BY searched_at DESC LIMIT ?
+                    )
+                """,
+                    [(u, u, HISTORY_SIZE) for u in {u for u, _ in history}],
+                )
+        except Exception:
+            # Try again next time, keeping the oldest searches if it overflows
+            with self._lock:
+                self._pending[:0] = batch[: MAX_PENDING - len(self._pending)]
+            raise
+        return len(batch)
+
+    def recent(self, username, limit=HISTORY_SIZE):
+        """The user's latest distinct terms, newest first, unflushed ones too."""
+        with self._lock:
+            pending = [term for user, term, _ in self._pending if user == username]
+        with connect(self.db_path, readonly=True) as conn:
+            stored = conn.execute(
+                "SELECT term FROM search_history WHERE username = ? ORDER BY searched_at DESC LIMIT ?",
+                (username, limit),
+            ).fetchall()
+        terms = list(reversed(pending)) + [term for (term,) in stored]
+        return list(dict.fromkeys(terms))[:limit]
+
+    def popular(self):
+        """Most searched classes and jobs lately, as name, kind and searches."""
+        loaded = self._popular_loaded
+        if loaded is None or time.monotonic() - loaded >= POPULAR_INTERVAL:
+            with connect(self.db_path, readonly=True) as conn:
+                rows = conn.execute(
+                    "SELECT name, kind, searches FROM popular_searches ORDER BY rank"
+                ).fetchall()
+            self._popular = [
+                {"name": name, "kind": kind, "searches": searches}
+                for name, kind, searches in rows
+            ]
+            self._popular_loaded = time.monotonic()
+        return self._popular
+
+    def update_popular(self):
+        """Recompute popular_searches unless any process did so recently."""
+        checked = self._popular_checked
+        if checked is not None and time.monotonic() - checked < POPULAR_INTERVAL:
+            return False
+        self._popular_checked = time.monotonic()
+        now = time.time()
+        with connect(self.db_path) as conn, conn:
+            computed_at = conn.execute(
+                "SELECT MAX(computed_at) FROM popular_searches"
+            ).fetchone()[0]
+            if computed_at is not None and now - computed_at < POPULAR_INTERVAL:
+                return False
+            conn.execute(
+                "DELETE FROM search_counts WHERE hour < ?",
+                (int(now // 3600) - POPULAR_HOURS,),
+            )
+            term_counts = conn.execute(
+                "SELECT term, SUM(count) AS searches FROM search_counts GROUP BY term ORDER BY searches DESC LIMIT ?",
+                (POPULAR_TERMS,),
+            ).fetchall()
+            items = popular_items(get_catalog(self.db_path), term_counts)
+            conn.execute("DELETE FROM popular_searches")
+            conn.executemany(
+                "INSERT INTO popular_searches(rank, name, kind, searches, computed_at) VALUES(?,?,?,?,?)",
+                [
+                    (rank, item["name"], item["kind"], item["searches"], now)
+                    for rank, item in enumerate(items, 1)
+                ],
+            )
+        # Show the new list on this process's next page
+        self._popular_loaded = None
+        return True
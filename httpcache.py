@@ -0,0 +1,112 @@
+# ------------------- IMPORTS -------------------
+from datetime import datetime, timezone
+import gzip
+import hashlib
+import os
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # gzip alone is fine, brotli just squeezes a bit more
+    brotli = None
+
+# ------------------- CONSTANTS -------------------
+# Below this the headers cost more than compression saves
+COMPRESS_MIN_SIZE = 500
+COMPRESS_MIMETYPES = {
+    "text/html",
+    "text/css",
+    "text/csv",
+    "text/plain",
+    "application/javascript",
+    "application/json",
+}
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Bodies compressed once and served many times can afford the slowest settings
+PACKED_GZIP_LEVEL = 9
+PACKED_BROTLI_QUALITY = 11
+
+
+# ------------------- CONDITIONAL REQUESTS -------------------
+def release_tag(*paths):
+    """Short hash of when the given files (or files under directories) changed."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files += [os.path.join(root, name) for name in names]
+        else:
+            files.append(path)
+    stamps = hashlib.sha1()
+    for path in sorted(files):
+        stat = os.stat(path)
+        stamps.update(f"{path}:{stat.st_mtime_ns}:{stat.st_size};".encode())
+    return stamps.hexdigest()[:8]
+
+
+def not_modified(etag, last_modified=None):
+    """True if the client's cached copy (by ETag, else date) is still current."""
+    if request.method not in ("GET", "HEAD"):
+        return False
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    since = request.if_modified_since
+    if since is not None and last_modified:
+        return int(last_modified) <= since.timestamp()
+    return False
+
+
+def set_validators(response, etag, last_modified=None, private=False):
+    """Tag a response so clients revalidate it instead of refetching."""
+    # Weak, since compression changes the bytes but not the meaning
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = datetime.fromtimestamp(
+            int(last_modified), timezone.utc
+        )
+    response.cache_control.no_cache = True
+    if private:
+        response.cache_control.private = True
+    else:
+        response.cache_control.public = True
+    return response
+
+
+# ------------------- COMPRESSION -------------------
+def choose_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def compress_response(response):
+    """after_request hook: brotli/gzip text responses for clients that accept it."""
+    if (
+        response.mimetype not in COMPRESS_MIMETYPES
+        or response.direct_passthrough
+        or response.is_streamed
+        or response.status_code < 200
+        or response.status_code in (204, 304)
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = choose_encoding()
+    data = response.get_data()
+    if encoding is None or len(data) < COMPRESS_MIN_SIZE:
+        return response
+    if encoding == "br":
+        data = brotli.compress(data, quality=BROTLI_QUALITY)
+    else:
+        data = gzip.compress(data, GZIP_LEVEL, mtime=0)
+    response.set_data(data)
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
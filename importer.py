@@ -0,0 +1,258 @@
+# ------------------- IMPORTS -------------------
+from catalog import bump_catalog_version
+from db import connect
+from ingest import CatalogCsv
+
+# ------------------- CONSTANTS -------------------
+BATCH_SIZE = 1000
+
+
+# ------------------- RESULTS -------------------
+class ImportResult:
+    """Row counts for one import run."""
+
+    def __init__(self):
+        self.inserted = 0
+        self.updated = 0
+        self.linked = 0
+        self.skipped = 0
+        self.errors = []
+
+    @property
+    def changed(self):
+        return bool(self.inserted or self.updated or self.linked)
+
+    def __str__(self):
+        text = f"{self.inserted} added, {self.updated} updated"
+        if self.linked:
+            text += f", {self.linked} linked"
+        text += f", {self.skipped} skipped"
+        if self.errors:
+            line, message = self.errors[0]
+            text += f", {len(self.errors)} bad rows (line {line}: {message})"
+        return text
+
+
+# ------------------- ENGINE -------------------
+def _same(old, new):
+    # Usually the types line up; otherwise SQLite hands back TEXT columns
+    # as str whatever the CSV gave us
+    return old == new or all(str(a) == str(b) for a, b in zip(old, new))
+
+
+def _upsert(conn, table, key_cols, value_cols, rows, result, on_batch=None):
+    """Insert or update rows keyed on key_cols, in batches of executemany.
+
+    Existing rows are read once into a dict, so each CSV row costs a dict
+    lookup instead of a SELECT. Later rows for the same key win, exactly as
+    calling add_class/add_job row by row did. A None row counts as skipped.
+    on_batch, if given, is called after each full batch is written.
+    """
+    cursor = conn.cursor()
+    k = len(key_cols)
+    cols = key_cols + value_cols
+    existing = {}
+    cursor.execute(f"SELECT id, {', '.join(cols)} FROM {table}")
+    for row in cursor:
+        existing[row[1 : 1 + k]] = (row[0], row[1 + k :])
+
+    insert_sql = (
+        f"INSERT INTO {table}({', '.join(cols)}) VALUES({', '.join('?' * len(cols))})"
+    )
+    update_sql = (
+        f"UPDATE {table} SET {', '.join(c + '=?' for c in value_cols)} WHERE id=?"
+    )
+    inserts = {}
+    updates = {}
+
+    def flush():
+        if inserts:
+            last_id = cursor.execute(f"SELECT MAX(id) FROM {table}").fetchone()[0]
+            cursor.executemany(insert_sql, [key + v for key, v in inserts.items()])
+            # Inside our write transaction each insert gets MAX(id) + 1, so
+            # the new ids follow on in order; remembering them turns repeats
+            # later in the file into updates without reading the rows back
+            for new_id, (key, values) in enumerate(inserts.items(), (last_id or 0) + 1):
+                existing[key] = (new_id, values)
+            inserts.clear()
+        if updates:
+            cursor.executemany(update_sql, [v + (i,) for i, v in updates.items()])
+            updates.clear()
+
+    for row in rows:
+        if row is None:
+            result.skipped += 1
+            continue
+        key, values = tuple(row[:k]), tuple(row[k:])
+        known = existing.get(key)
+        if known is None and key in inserts:
+            inserts[key] = values
+            result.updated += 1
+        elif known is None:
+            inserts[key] = values
+            result.inserted += 1
+        elif _same(known[1], values):
+            result.skipped += 1
+        else:
+            existing[key] = (known[0], values)
+            updates[known[0]] = values
+            result.updated += 1
+        if len(inserts) + len(updates) >= BATCH_SIZE:
+            flush()
+            if on_batch:
+                on_batch()
+    flush()
+
+
+def upsert_classes(db_path, rows):
+    """Upsert (name, year, is_mandatory, prerequisites) rows in one transaction."""
+    result = ImportResult()
+    with connect(db_path) as conn, conn:
+        _upsert(
+            conn,
+            "classes",
+            ["name", "year"],
+            ["is_mandatory", "prerequisites"],
+            rows,
+            result,
+        )
+        if result.changed:
+            bump_catalog_version(conn)
+    return result
+
+
+def upsert_jobs(db_path, rows):
+    """Upsert (name, salary_avg, area) rows in one transaction."""
+    result = ImportResult()
+    with connect(db_path) as conn, conn:
+        _upsert(conn, "jobs", ["name"], ["salary_avg", "area"], rows, result)
+        if result.changed:
+            bump_catalog_version(conn)
+    return result
+
+
+def _link(conn, rows, result, on_batch=None):
+    """Link (class, job_name) rows, where class is an id or a (name, year) key.
+
+    Job names are matched case-insensitively. Rows naming an unknown class or
+    job, and links that already exist, are skipped.
+    """
+    cursor = conn.cursor()
+    job_ids = {
+        name.lower(): job_id
+        for job_id, name in cursor.execute("SELECT id, name FROM jobs")
+        if name
+    }
+    class_ids = {}
+    for class_id, name, year in cursor.execute("SELECT id, name, year FROM classes"):
+        class_ids[class_id] = class_id
+        class_ids[(name, year)] = class_id
+    links = set(cursor.execute("SELECT class_id, job_id FROM job_classes"))
+
+    batch = []
+    for row in rows:
+        if row is None:
+            result.skipped += 1
+            continue
+        class_ref, job_name = row
+        class_id = class_ids.get(class_ref)
+        job_id = job_ids.get(job_name.strip().lower())
+        if class_id is None or job_id is None or (class_id, job_id) in links:
+            result.skipped += 1
+            continue
+        links.add((class_id, job_id))
+        batch.append((class_id, job_id))
+        result.linked += 1
+        if len(batch) >= BATCH_SIZE:
+            cursor.executemany(
+                "INSERT INTO job_classes(class_id, job_id) VALUES (?, ?)", batch
+            )
+            batch.clear()
+            if on_batch:
+                on_batch()
+    if batch:
+        cursor.executemany(
+            "INSERT INTO job_classes(class_id, job_id) VALUES (?, ?)", batch
+        )
+
+
+def link_job_classes(db_path, rows):
+    """Link (class_id, job_name) rows in one transaction."""
+    result = ImportResult()
+    with connect(db_path) as conn, conn:
+        _link(conn, rows, result)
+        if result.changed:
+            bump_catalog_version(conn)
+    return result
+
+
+def import_csv(db_path, f, kind=None, on_batch=None):
+    """Import a catalog CSV in any layout CatalogCsv knows.
+
+    Class files that carry job lists are linked in the same pass, matching
+    classes on (name, year) since vendor ids rarely line up with ours.
+
+    Everything is one transaction unless on_batch is given: then each batch
+    of BATCH_SIZE rows is committed on its own, so a big file never holds
+    the write lock for long. on_batch(conn, result) runs inside each batch's
+    transaction, just before its commit.
+    """
+    reader = CatalogCsv(f, kind)
+    result = ImportResult()
+    # The same list, so progress reports can count bad rows as they happen
+    result.errors = reader.errors
+    with connect(db_path) as conn, conn:
+        checkpoint = None
+        if on_batch:
+
+            def checkpoint():
+                if result.changed:
+                    bump_catalog_version(conn)
+                on_batch(conn, result)
+                conn.commit()
+
+        if reader.kind == "jobs":
+            rows = ((r["name"], r["salary_avg"], r["area"]) for r in reader)
+            _upsert(
+                conn,
+                "jobs",
+                ["name"],
+                ["salary_avg", "area"],
+                rows,
+                result,
+                checkpoint,
+            )
+        elif reader.kind == "classes":
+            links = []
+
+            def rows():
+                for r in reader:
+                    for year in r["years"]:
+                        yield (
+                            r["name"],
+                            year,
+                            int(r["is_mandatory"]),
+                            r["prerequisites"],
+                        )
+                        if r["jobs"]:
+                            links.extend(((r["name"], year), job) for job in r["jobs"])
+
+            _upsert(
+                conn,
+                "classes",
+                ["name", "year"],
+                ["is_mandatory", "prerequisites"],
+                rows(),
+                result,
+                checkpoint,
+            )
+            if links:
+                _link(conn, links, result, checkpoint)
+        else:
+            rows = ((r["class_id"], job) for r in reader for job in r["jobs"])
+            _link(conn, rows, result, checkpoint)
+        if result.changed:
+            bump_catalog_version(conn)
+        if on_batch:
+            on_batch(conn, result)
+    return result
@@ -0,0 +1,138 @@
+# ------------------- IMPORTS -------------------
+from concurrent.futures import ThreadPoolExecutor
+import io
+import time
+
+from catalog import refresh_catalog
+from db import connect
+from importer import import_csv
+from publish import ShadowCatalog
+
+# ------------------- CONSTANTS -------------------
+RECENT_IMPORTS = 5
+# A job that hasn't reported for this long died along with its process
+STALE_AFTER = 600
+ACTIVE = ("queued", "running")
+COLUMNS = [
+    "id",
+    "filename",
+    "kind",
+    "status",
+    "bytes_total",
+    "bytes_read",
+    "inserted",
+    "updated",
+    "linked",
+    "skipped",
+    "bad_rows",
+    "message",
+    "created_at",
+    "updated_at",
+    "finished_at",
+]
+
+
+# ------------------- STATUS -------------------
+def import_dict(row):
+    job = dict(zip(COLUMNS, row))
+    if job["status"] in ACTIVE and time.time() - job["updated_at"] > STALE_AFTER:
+        job["status"] = "interrupted"
+    total = job["bytes_total"]
+    job["progress"] = round(job["bytes_read"] / total, 3) if total else None
+    return job
+
+
+def get_import(db_path, job_id):
+    with connect(db_path, readonly=True) as conn:
+        row = conn.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM import_jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+    return import_dict(row) if row else None
+
+
+def recent_imports(db_path, limit=RECENT_IMPORTS):
+    """Latest imports, newest first."""
+    with connect(db_path, readonly=True) as conn:
+        rows = conn.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM import_jobs ORDER BY id DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+    return [import_dict(row) for row in rows]
+
+
+# ------------------- RUNNER -------------------
+class ImportRunner:
+    """Runs uploaded catalog files through import_csv on a background thread.
+
+    Imports run one at a time, each into a shadow copy of the catalog that
+    is published in one go when the file is done, so students never see a
+    half-imported catalog. Progress goes to import_jobs after every batch,
+    where any worker process can report it.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="catalog-import")
+
+    def submit(self, stream, filename, kind=None):
+        """Queue a binary stream for import; the runner closes it when done."""
+        stream.seek(0, io.SEEK_END)
+        total = stream.tell()
+        stream.seek(0)
+        now = time.time()
+        with connect(self.db_path) as conn, conn:
+            job_id = conn.execute(
+                "INSERT INTO import_jobs(filename, kind, status, bytes_total, created_at, updated_at) VALUES(?,?,?,?,?,?)",
+                (filename, kind, "queued", total, now, now),
+            ).lastrowid
+        self._executor.submit(self._run, job_id, stream, kind)
+        return job_id
+
+    def _run(self, job_id, stream, kind):
+        self._set_status(job_id, "running")
+        try:
+            with io.TextIOWrapper(stream, encoding="utf-8-sig", newline="") as f:
+                with ShadowCatalog(self.db_path) as shadow:
+
+                    def on_batch(conn, result):
+                        self._progress(job_id, stream.tell(), result)
+
+                    result = import_csv(shadow.path, f, kind, on_batch)
+                    if result.changed:
+                        self._set_status(job_id, "running", "publishing")
+                        shadow.publish()
+        except Exception as e:
+            self._set_status(job_id, "failed", str(e) or type(e).__name__)
+        else:
+            refresh_catalog(self.db_path)
+            self._set_status(job_id, "done", str(result))
+
+    def _progress(self, job_id, bytes_read, result):
+        with connect(self.db_path) as conn, conn:
+            conn.execute(
+                "UPDATE import_jobs SET bytes_read = ?, inserted = ?, updated = ?, linked = ?, skipped = ?, bad_rows = ?, updated_at = ? WHERE id = ?",
+                (
+                    bytes_read,
+                    result.inserted,
+                    result.updated,
+                    result.linked,
+                    result.skipped,
+                    len(result.errors),
+                    time.time(),
+                    job_id,
+                ),
+            )
+
+    def _set_status(self, job_id, status, message=None):
+        now = time.time()
+        finished = now if status not in ACTIVE else None
+        with connect(self.db_path) as conn, conn:
+            if status == "done":
+                conn.execute(
+                    "UPDATE import_jobs SET bytes_read = bytes_total WHERE id = ?",
+                    (job_id,),
+                )
+            conn.execute(
+                "UPDATE import_jobs SET status = ?, message = ?, updated_at = ?, finished_at = ? WHERE id = ?",
+                (status, message, now, finished, job_id),
+            )
@@ -0,0 +1,249 @@
+# ------------------- IMPORTS -------------------
+from itertools import chain
+import csv
+import io
+import re
+
+# ------------------- CONSTANTS -------------------
+SAMPLE_SIZE = 64 * 1024
+DELIMITERS = [",", ";", "\t", "|"]
+TRUE_WORDS = {"true", "yes", "y", "1", "mandatory", "compulsory"}
+
+REQUIRED_FIELDS = {
+    "classes": {"name", "year"},
+    "jobs": {"name"},
+    "links": {"class_id", "jobs"},
+}
+
+LEGACY_CLASS_FIELDS = ["name", "year", "is_mandatory", "prerequisites"]
+
+# Every header spelling seen in static/data, mapped to one field name
+HEADER_ALIASES = {
+    "id": "class_id",
+    "class_id": "class_id",
+    "name": "name",
+    "class_name": "name",
+    "subject": "name",
+    "course_name": "name",
+    "year": "year",
+    "years": "year",
+    "level": "year",
+    "is_mandatory": "is_mandatory",
+    "mandatory": "is_mandatory",
+    "compulsory": "is_mandatory",
+    "prerequisites": "prerequisites",
+    "prerequisite": "prerequisites",
+    "required_classes": "prerequisites",
+    "jobs": "jobs",
+    "job": "jobs",
+    "job_id": "jobs",
+    "careers": "jobs",
+    "avg_salary": "salary_avg",
+    "salary_avg": "salary_avg",
+    "salary": "salary_avg",
+    "area": "area",
+}
+
+
+# ------------------- LAYOUT -------------------
+class RowError(Exception):
+    pass
+
+
+class Layout:
+    """Which column holds which field, and what kind of rows the file has."""
+
+    def __init__(self, header, kind=None):
+        self.header = header
+        self.columns = {}
+        for i, title in enumerate(header):
+            field = HEADER_ALIASES.get(normalize_header(title))
+            if field and field not in self.columns:
+                self.columns[field] = i
+
+        # The original class upload format was positional, whatever its header
+        if len(header) == len(LEGACY_CLASS_FIELDS):
+            for i, field in enumerate(LEGACY_CLASS_FIELDS):
+                if i not in self.columns.values():
+                    self.columns.setdefault(field, i)
+
+        has = self.columns.keys()
+        if kind is None:
+            if {"name", "year"} <= has:
+                kind = "classes"
+            elif "name" in has and has & {"salary_avg", "area"}:
+                kind = "jobs"
+            elif {"class_id", "jobs"} <= has:
+                kind = "links"
+        if kind is None or not REQUIRED_FIELDS[kind] <= has:
+            raise ValueError(f"Unrecognised CSV header: {', '.join(header)}")
+        self.kind = kind
+
+    def picker(self, name):
+        """Function doing field(row, name) with the column looked up once."""
+        i = self.columns.get(name)
+        if i is None:
+            return lambda row: ""
+        return lambda row: row[i].strip() if i < len(row) else ""
+
+    def field(self, row, name, default=""):
+        i = self.columns.get(name)
+        if i is None or i >= len(row):
+            return default
+        return row[i].strip()
+
+    def jobs(self, row):
+        i = self.columns.get("jobs")
+        if i is None or i >= len(row):
+            return []
+        # Unquoted job lists spill into extra columns; they all belong here
+        cells = row[i:] if i == len(self.header) - 1 else [row[i]]
+        return [j.strip() for cell in cells for j in split_list(cell) if j.strip()]
+
+
+# ------------------- HELPERS -------------------
+def normalize_header(title):
+    return re.sub(r"[^a-z0-9]+", "_", title.strip().lower()).strip("_")
+
+
+def split_list(cell):
+    return cell.split(";") if ";" in cell else cell.split(",")
+
+
+def parse_int(value, what):
+    try:
+        return int(value)
+    except ValueError:
+        raise RowError(f"bad {what} {value!r}") from None
+
+
+def parse_years(years_range):
+    """'9-13' -> [9, 10, 11, 12, 13], '11' -> [11]."""
+    years_range = years_range.strip()
+    if years_range.isdigit():
+        return [int(years_range)]
+    if "-" in years_range:
+        start, _, end = years_range.partition("-")
+        return list(range(parse_int(start, "year"), parse_int(end, "year") + 1))
+    return [parse_int(years_range, "year")]
+
+
+def parse_bool(value):
+    return value.strip().lower() in TRUE_WORDS
+
+
+def parse_salary(value):
+    # A blank salary is a job nobody has priced yet, not a bad row
+    if not value.strip():
+        return None
+    try:
+        return int(float(re.sub(r"[^0-9.]", "", value)))
+    except ValueError:
+        raise RowError(f"bad salary {value!r}") from None
+
+
+def sniff_delimiter(header_line):
+    """Pick the candidate delimiter that splits the header the most."""
+    return max(DELIMITERS, key=header_line.count)
+
+
+# ------------------- READER -------------------
+class CatalogCsv:
+    """One streaming pass over a catalog CSV in any of the known layouts.
+
+    Iterating yields dicts with the fields the layout provides. Rows that
+    can't be parsed are skipped and recorded in errors as (line, message).
+    Passing kind ("classes", "jobs" or "links") skips layout detection.
+    """
+
+    def __init__(self, f, kind=None):
+        # Read a sample for sniffing, then finish its last line so the
+        # chained reader never sees a line split in two
+        sample = f.read(SAMPLE_SIZE)
+        sample += f.readline()
+        first_line = sample.split("\n", 1)[0]
+        self.errors = []
+        self.delimiter = sniff_delimiter(first_line)
+        self._rows = csv.reader(chain(io.StringIO(sample), f), delimiter=self.delimiter)
+
+        header = next(self._rows, None)
+        if header is None:
+            raise ValueError("CSV file is empty")
+        # Some exports quote each whole line, leaving one comma-laden cell
+        self.wrapped = len(header) == 1 and "," in header[0]
+        if self.wrapped:
+            header = self._unwrap(header)
+        self.layout = Layout(header, kind)
+
+    @property
+    def kind(self):
+        return self.layout.kind
+
+    def _unwrap(self, row):
+        return next(csv.reader([row[0]])) if row else row
+
+    def __iter__(self):
+        parse = self._parser()
+        for row in self._rows:
+            if self.wrapped:
+                row = self._unwrap(row)
+            if not "".join(row).strip():
+                continue
+            try:
+                yield parse(row)
+            except RowError as e:
+                self.errors.append((self._rows.line_num, str(e)))
+
+    def _parser(self):
+        """Row -> record function for this file's kind.
+
+        Columns are looked up once per file rather than once per cell,
+        which is most of the per-row cost of a big import.
+        """
+        layout = self.layout
+        if layout.kind == "links":
+            class_id = layout.picker("class_id")
+
+            def parse(row):
+                return {
+                    "class_id": parse_int(class_id(row), "class id"),
+                    "jobs": layout.jobs(row),
+                }
+
+            return parse
+
+        name = layout.picker("name")
+        if layout.kind == "jobs":
+            salary_avg = layout.picker("salary_avg")
+            area = layout.picker("area")
+
+            def parse(row):
+                record = {"name": name(row)}
+                if not record["name"]:
+                    raise RowError("missing name")
+                record["salary_avg"] = parse_salary(salary_avg(row))
+                record["area"] = area(row)
+                return record
+
+            return parse
+
+        year = layout.picker("year")
+        is_mandatory = layout.picker("is_mandatory")
+        prerequisites = layout.picker("prerequisites")
+        class_id = layout.picker("class_id")
+        has_jobs = "jobs" in layout.columns
+
+        def parse(row):
+            record = {"name": name(row)}
+            if not record["name"]:
+                raise RowError("missing name")
+            record["years"] = parse_years(year(row))
+            record["is_mandatory"] = parse_bool(is_mandatory(row))
+            record["prerequisites"] = prerequisites(row)
+            record["jobs"] = layout.jobs(row) if has_jobs else []
+            vendor_id = class_id(row)
+            if vendor_id:
+                record["class_id"] = parse_int(vendor_id, "class id")
+            return record
+
+        return parse
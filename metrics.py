@@ -0,0 +1,248 @@
+# ------------------- IMPORTS -------------------
+from bisect import bisect_left
+from contextlib import contextmanager
+import os
+import threading
+import time
+
+from colorama import Fore, Style
+
+# ------------------- CONSTANTS -------------------
+REQUEST_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+QUERY_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.5,
+    1,
+)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500, 1000)
+# Log requests slower than this many milliseconds; unset turns the log off
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0")) or None
+SLOW_TOP_QUERIES = 5
+
+
+# ------------------- HISTOGRAMS -------------------
+class Histogram:
+    """Prometheus-style histogram, one series per combination of label values."""
+
+    def __init__(self, name, help, labels=(), buckets=REQUEST_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # Per-bucket counts, then the +Inf bucket, sum and count
+                series = [0] * (len(self.buckets) + 1) + [0.0, 0]
+                self._series[label_values] = series
+            series[bisect_left(self.buckets, value)] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, *label_values):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {k: list(v) for k, v in self._series.items()}
+        for label_values, series in sorted(snapshot.items()):
+            pairs = [
+                f'{name}="{escape(value)}"'
+                for name, value in zip(self.labels, label_values)
+            ]
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                le = ",".join(pairs + [f'le="{bound}"'])
+                lines.append(f"{self.name}_bucket{{{le}}} {cumulative}")
+            labels = "{" + ",".join(pairs) + "}" if pairs else ""
+            lines.append(f"{self.name}_sum{labels} {series[-2]}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+# ------------------- COUNTERS -------------------
+class Counter:
+    """Prometheus-style counter, one series per combination of label values."""
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._series = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, *label_values):
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + 1
+
+    def value(self, *label_values):
+        with self._lock:
+            return self._series.get(label_values, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = dict(self._series)
+        for label_values, count in sorted(snapshot.items()):
+            pairs = [
+                f'{name}="{escape(value)}"'
+                for name, value in zip(self.labels, label_values)
+            ]
+            labels = "{" + ",".join(pairs) + "}" if pairs else ""
+            lines.append(f"{self.name}_total{labels} {count}")
+        return lines
+
+
+def escape(value):
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+REGISTRY = []
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling a request.",
+    ("endpoint", "method", "status"),
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_sql_queries",
+    "SQL statements run while handling a request.",
+    ("endpoint",),
+    COUNT_BUCKETS,
+)
+QUERY_SECONDS = Histogram(
+    "sql_query_duration_seconds",
+    "Time spent in one SQL statement, by its first keyword.",
+    ("statement",),
+    QUERY_BUCKETS,
+)
+TEMPLATE_SECONDS = Histogram(
+    "template_render_duration_seconds",
+    "Time spent rendering a template.",
+    ("template",),
+)
+EMAIL_SECONDS = Histogram(
+    "email_send_duration_seconds",
+    "Time spent handing one email to the SMTP relay.",
+    ("result",),
+)
+BACKGROUND_ERRORS = Counter(
+    "background_errors",
+    "Errors caught by background threads, by thread.",
+    ("worker",),
+)
+RENDER_CACHE_LOOKUPS = Counter(
+    "render_cache_lookups",
+    "Catalog fragments looked up in the render cache, by whether one was stored.",
+    ("result",),
+)
+
+
+def render_all():
+    """Every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+# ------------------- PER REQUEST -------------------
+_local = threading.local()
+
+
+def start_request():
+    _local.started = time.perf_counter()
+    _local.queries = []
+
+
+def record_query(sql, seconds):
+    """Called by the database layer for every statement it runs."""
+    words = sql.split(None, 1)
+    QUERY_SECONDS.observe(seconds, words[0].upper() if words else "")
+    queries = getattr(_local, "queries", None)
+    if queries is not None:
+        queries.append((sql, seconds))
+
+
+def start_template():
+    _local.template_started = time.perf_counter()
+
+
+def finish_template(name):
+    started = getattr(_local, "template_started", None)
+    if started is not None:
+        TEMPLATE_SECONDS.observe(time.perf_counter() - started, name)
+        _local.template_started = None
+
+
+def finish_request(endpoint, method, status):
+    """Record the request started on this thread; logs it if it was slow."""
+    started = getattr(_local, "started", None)
+    queries = getattr(_local, "queries", None)
+    _local.started = _local.queries = None
+    if started is None:
+        return
+    seconds = time.perf_counter() - started
+    endpoint = endpoint or "unmatched"
+    REQUEST_SECONDS.observe(seconds, endpoint, method, str(status))
+    REQUEST_QUERIES.observe(len(queries), endpoint)
+    if SLOW_REQUEST_MS is not None and seconds * 1000 >= SLOW_REQUEST_MS:
+        log_slow_request(endpoint, method, status, seconds, queries)
+
+
+def log_slow_request(endpoint, method, status, seconds, queries):
+    # The same statement run in a loop is the usual culprit, so group by text
+    totals = {}
+    for sql, query_seconds in queries:
+        count, total = totals.get(sql, (0, 0.0))
+        totals[sql] = (count + 1, total + query_seconds)
+    top = sorted(totals.items(), key=lambda item: item[1][1], reverse=True)
+    print(
+        f"{Fore.YELLOW}slow request: {method} {endpoint} -> {status} in "
+        f"{seconds * 1000:.0f} ms, {len(queries)} queries{Style.RESET_ALL}"
+    )
+    for sql, (count, total) in top[:SLOW_TOP_QUERIES]:
+        print(f"  {total * 1000:8.1f} ms  x{count:<4} {' '.join(sql.split())[:160]}")
+
+
+# ------------------- BACKGROUND -------------------
+def report_error(worker, error):
+    """Log an error a background thread caught and carried on from."""
+    BACKGROUND_ERRORS.inc(worker)
+    print(f"{Fore.RED}{worker}: {error}{Style.RESET_ALL}")
@@ -0,0 +1,102 @@
+# ------------------- IMPORTS -------------------
+import sqlite3
+
+# ------------------- MIGRATIONS -------------------
+# Applied in order; PRAGMA user_version records how many have run.
+# Never edit one that has shipped, add a new entry instead.
+MIGRATIONS = [
+    # 1: the tables main.db was created with, so a fresh file works too
+    """
+    CREATE TABLE IF NOT EXISTS classes (id INTEGER PRIMARY KEY, name TEXT, year INTEGER, is_mandatory INTEGER, prerequisites TEXT);
+    CREATE TABLE IF NOT EXISTS jobs (id INTEGER PRIMARY KEY, name TEXT, salary_avg TEXT, area text);
+    CREATE TABLE IF NOT EXISTS job_classes (id INTEGER PRIMARY KEY, job_id INTEGER REFERENCES jobs (id), class_id INTEGER REFERENCES classes (id));
+    CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY, username TEXT UNIQUE, password TEXT, pfp TEXT DEFAULT "default pfp.jpg", code TEXT UNIQUE, email TEXT, key INTEGER UNIQUE, is_verified BOOLEAN);
+    """,
+    # 2: lookup indexes for name searches and job -> classes joins
+    """
+    CREATE INDEX IF NOT EXISTS classes_name ON classes (name, year);
+    CREATE INDEX IF NOT EXISTS classes_name_lower ON classes (LOWER(name));
+    CREATE INDEX IF NOT EXISTS jobs_name ON jobs (name);
+    CREATE INDEX IF NOT EXISTS jobs_name_lower ON jobs (LOWER(name));
+    CREATE INDEX IF NOT EXISTS job_classes_job ON job_classes (job_id);
+    """,
+    # 3: one row per link; the unique index also serves class_id lookups
+    """
+    DELETE FROM job_classes WHERE id NOT IN (
+        SELECT MIN(id) FROM job_classes GROUP BY class_id, job_id
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS job_classes_pair ON job_classes (class_id, job_id);
+    """,
+    # 4: verification emails waiting for the background sender
+    """
+    CREATE TABLE IF NOT EXISTS email_outbox (id INTEGER PRIMARY KEY, recipient TEXT NOT NULL, subject TEXT, body TEXT, created_at REAL, attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL, sent_at REAL, failed_at REAL, last_error TEXT);
+    CREATE INDEX IF NOT EXISTS email_outbox_due ON email_outbox (next_attempt_at) WHERE sent_at IS NULL AND failed_at IS NULL;
+    """,
+    # 5: bumped by every catalog write, so caches and ETags know when to change
+    """
+    CREATE TABLE IF NOT EXISTS catalog_version (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL, updated_at REAL NOT NULL);
+    INSERT OR IGNORE INTO catalog_version VALUES (1, 1, CAST(strftime('%s', 'now') AS REAL));
+    """,
+    # 6: background catalog imports and how far along they are
+    """
+    CREATE TABLE IF NOT EXISTS import_jobs (id INTEGER PRIMARY KEY, filename TEXT, kind TEXT, status TEXT NOT NULL, bytes_total INTEGER, bytes_read INTEGER NOT NULL DEFAULT 0, inserted INTEGER NOT NULL DEFAULT 0, updated INTEGER NOT NULL DEFAULT 0, linked INTEGER NOT NULL DEFAULT 0, skipped INTEGER NOT NULL DEFAULT 0, bad_rows INTEGER NOT NULL DEFAULT 0, message TEXT, created_at REAL, updated_at REAL, finished_at REAL);
+    """,
+    # 7: salaries as numbers, so ranges and ordering can use an index. SQLite
+    # can't change a column's type, so jobs is rebuilt with the same ids
+    """
+    CREATE TABLE jobs_new (id INTEGER PRIMARY KEY, name TEXT, salary_avg INTEGER, area TEXT);
+    INSERT INTO jobs_new (id, name, salary_avg, area)
+        SELECT id, name,
+            CASE WHEN salary_avg GLOB '*[0-9]*'
+                THEN CAST(CAST(REPLACE(REPLACE(REPLACE(TRIM(salary_avg), '$', ''), ',', ''), ' ', '') AS REAL) AS INTEGER)
+            END,
+            area
+        FROM jobs;
+    DROP TABLE jobs;
+    ALTER TABLE jobs_new RENAME TO jobs;
+    CREATE INDEX IF NOT EXISTS jobs_name ON jobs (name);
+    CREATE INDEX IF NOT EXISTS jobs_name_lower ON jobs (LOWER(name));
+    CREATE INDEX IF NOT EXISTS jobs_salary ON jobs (salary_avg);
+    CREATE INDEX IF NOT EXISTS jobs_area_salary ON jobs (area, salary_avg);
+    """,
+    # 8: what each user searched for, and hourly search counts for popular items
+    """
+    CREATE TABLE IF NOT EXISTS search_history (username TEXT NOT NULL, term TEXT NOT NULL, count INTEGER NOT NULL DEFAULT 0, searched_at REAL NOT NULL, PRIMARY KEY (username, term));
+    CREATE INDEX IF NOT EXISTS search_history_recent ON search_history (username, searched_at);
+    CREATE TABLE IF NOT EXISTS search_counts (term TEXT NOT NULL, hour INTEGER NOT NULL, count INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (term, hour));
+    CREATE INDEX IF NOT EXISTS search_counts_hour ON search_counts (hour);
+    CREATE TABLE IF NOT EXISTS popular_searches (rank INTEGER PRIMARY KEY, name TEXT NOT NULL, kind TEXT NOT NULL, searches INTEGER NOT NULL, computed_at REAL NOT NULL);
+    """,
+]
+
+
+# ------------------- RUNNER -------------------
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(db_path):
+    """Bring the database up to date and switch it to WAL journaling."""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        # WAL lets readers carry on while an admin write is in progress
+        conn.execute("PRAGMA journal_mode=WAL")
+        while True:
+            # Re-read the version under the write lock in case another
+            # worker migrated while we waited for it
+            conn.execute("BEGIN IMMEDIATE")
+            version = schema_version(conn)
+            if version >= len(MIGRATIONS):
+                conn.execute("COMMIT")
+                return version
+            try:
+                for statement in MIGRATIONS[version].split(";"):
+                    if statement.strip():
+                        conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {version + 1}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+    finally:
+        conn.close()
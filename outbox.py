@@ -0,0 +1,132 @@
+# ------------------- IMPORTS -------------------
+import time
+
+from db import connect
+from worker import BackgroundWorker
+
+# ------------------- CONSTANTS -------------------
+BATCH_SIZE = 50
+POLL_INTERVAL = 5
+# A claimed message is retried after this long if its worker dies mid-send
+CLAIM_TIMEOUT = 120
+BACKOFF_BASE = 30
+BACKOFF_MAX = 3600
+MAX_ATTEMPTS = 8
+
+
+# ------------------- QUEUE -------------------
+def enqueue_email(conn, recipient, subject, body):
+    """Queue a message on conn; it is sent once the caller commits."""
+    now = time.time()
+    conn.execute(
+        "INSERT INTO email_outbox(recipient, subject, body, created_at, next_attempt_at) VALUES(?,?,?,?,?)",
+        (recipient, subject, body, now, now),
+    )
+
+
+def queue_depth(db_path):
+    """Counts of messages still waiting and ones given up on."""
+    with connect(db_path, readonly=True) as conn:
+        pending, failed = conn.execute("""
+            SELECT
+                COUNT(*) FILTER (WHERE sent_at IS NULL AND failed_at IS NULL),
+                COUNT(*) FILTER (WHERE failed_at IS NOT NULL)
+            FROM email_outbox
+        """).fetchone()
+    return {"pending": pending, "failed": failed}
+
+
+def backoff(attempts):
+    return min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+
+
+# ------------------- SENDER -------------------
+class OutboxWorker:
+    """Background thread that drains email_outbox over one SMTP connection.
+
+    connect_smtp() must return a context manager yielding send(recipient,
+    subject, body); it is opened once per batch. Point it at a local SMTP
+    server to test delivery without touching the real relay.
+    """
+
+    def __init__(self, db_path, connect_smtp, batch_size=BATCH_SIZE):
+        self.db_path = db_path
+        self.connect_smtp = connect_smtp
+        self.batch_size = batch_size
+        self._worker = BackgroundWorker(
+            "email-outbox", self.deliver_batch, POLL_INTERVAL
+        )
+
+    def start(self):
+        """Start the thread unless it is already running in this process."""
+        self._worker.start()
+
+    def wake(self):
+        self._worker.wake()
+
+    def _claim(self):
+        now = time.time()
+        with connect(self.db_path) as conn, conn:
+            return conn.execute(
+                """
+                UPDATE email_outbox SET next_attempt_at = ?
+                WHERE id IN (
+                    SELECT id FROM email_outbox
+                    WHERE sent_at IS NULL AND failed_at IS NULL AND next_attempt_at <= ?
+                    ORDER BY id LIMIT ?
+                )
+                RETURNING id, recipient, subject, body, attempts
+            """,
+                (now + CLAIM_TIMEOUT, now, self.batch_size),
+            ).fetchall()
+
+    def deliver_batch(self):
+        """Send one batch of due messages; returns how many were tried."""
+        batch = self._claim()
+        if not batch:
+            return 0
+        sent = []
+        errors = {}
+        try:
+            with self.connect_smtp() as send:
+                for message_id, recipient, subject, body, _ in batch:
+                    try:
+                        send(recipient, subject, body)
+                        sent.append(message_id)
+                    except Exception as e:
+                        errors[message_id] = str(e)
+        except Exception as e:
+            # Couldn't reach the relay at all: everything unsent is retried
+            for message_id, *_ in batch:
+                if message_id not in sent:
+                    errors.setdefault(message_id, str(e))
+        self._record(batch, sent, errors)
+        return len(batch)
+
+    def _record(self, batch, sent, errors):
+        now = time.time()
+        with connect(self.db_path) as conn, conn:
+            conn.executemany(
+                "UPDATE email_outbox SET sent_at = ?, attempts = attempts + 1 WHERE id = ?",
+                [(now, message_id) for message_id in sent],
+            )
+            retries = []
+            failures = []
+            for message_id, _, _, _, attempts in batch:
+                if message_id not in errors:
+                    continue
+                attempts += 1
+                if attempts >= MAX_ATTEMPTS:
+                    failures.append((now, errors[message_id], message_id))
+                else:
+                    retries.append(
+                        (now + backoff(attempts), errors[message_id], message_id)
+                    )
+            conn.executemany(
+                "UPDATE email_outbox SET attempts = attempts + 1, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                retries,
+            )
+            conn.executemany(
+                "UPDATE email_outbox SET attempts = attempts + 1, failed_at = ?, last_error = ? WHERE id = ?",
+                failures,
+            )
@@ -0,0 +1,224 @@
+# ------------------- IMPORTS -------------------
+from functools import lru_cache
+import re
+
+# ------------------- CONSTANTS -------------------
+FIRST_YEAR = 9
+LAST_YEAR = 13
+# NCEA Level 1-3 are taken in Years 11-13
+LEVEL_YEAR_OFFSET = 10
+SUBJECT_ALIASES = {
+    "maths": "mathematics",
+    "math": "mathematics",
+    "pe": "physical education",
+}
+GROUP_SPLIT = re.compile(r"\s*[,;]\s*|\s+and\s+", re.IGNORECASE)
+ALTERNATIVE_SPLIT = re.compile(r"\s+or\s+|\s*/\s*", re.IGNORECASE)
+YEAR_TOKEN = re.compile(r"\b(?:y|year)\s?(9|1[0-3])\b", re.IGNORECASE)
+LEVEL_TOKEN = re.compile(r"\b(?:l|level)\s?([1-3])\b", re.IGNORECASE)
+# Wording around the subject: "12 credits in", "Passed", "incl. Algebra"
+NOISE = re.compile(
+    r"^\s*(?:passed\s+|\d+\s+credits\s+in\s+)|\s+incl\..*$", re.IGNORECASE
+)
+
+
+# ------------------- PARSING -------------------
+@lru_cache(maxsize=4096)
+def parse_prerequisites(text):
+    """Free-text prerequisites -> (text, alternatives) groups, all required.
+
+    Any one alternative satisfies a group. Each is (subject, year), year
+    possibly None, or a plain string when it names no subject at all.
+    "Art Y10 or HOD approval" -> (("Art Y10 or HOD approval", (("art", 10), ...)),)
+    """
+    groups = []
+    for part in GROUP_SPLIT.split(text or ""):
+        if part.strip():
+            alternatives = tuple(
+                parse_alternative(a) for a in ALTERNATIVE_SPLIT.split(part) if a.strip()
+            )
+            groups.append((part.strip(), alternatives))
+    # Cached, and the same few strings repeat across years, so keep it immutable
+    return tuple(groups)
+
+
+def parse_alternative(text):
+    text = text.strip()
+    year = None
+    match = YEAR_TOKEN.search(text) or LEVEL_TOKEN.search(text)
+    if match:
+        year = int(match.group(1))
+        if match.re is LEVEL_TOKEN:
+            year += LEVEL_YEAR_OFFSET
+    subject = NOISE.sub("", YEAR_TOKEN.sub("", LEVEL_TOKEN.sub("", text)))
+    subject = " ".join(subject.split()).lower()
+    if not subject:
+        return text
+    return (SUBJECT_ALIASES.get(subject, subject), year)
+
+
+# ------------------- GRAPH -------------------
+class PrerequisiteGraph:
+    """Parsed prerequisites for every class, with the transitive closure.
+
+    Each requirement group is planned as its first alternative that is a
+    real class; groups with none (approvals, credit rules we can't check)
+    are kept as conditions. closure(c) is every class c needs before it,
+    precomputed so pathways for a whole cohort are just set unions.
+    """
+
+    def __init__(self, classes):
+        by_name = {}
+        for c in classes:
+            by_name.setdefault((c.name or "").lower(), []).append(c)
+        for same_name in by_name.values():
+            same_name.sort(key=lambda c: (c.year or 0, c.id))
+
+        self.requires = {}
+        self.alternatives = {}
+        self.conditions = {}
+        for c in classes:
+            if not c.prerequisites or not c.prerequisites.strip():
+                continue
+            planned, alternatives, conditions = [], [], []
+            for text, group in parse_prerequisites(c.prerequisites):
+                options = [self._resolve(c, alt, by_name) for alt in group]
+                options = tuple(o for o in dict.fromkeys(options) if o is not None)
+                if options:
+                    alternatives.append(options)
+                    planned.append(options[0])
+                else:
+                    conditions.append(text)
+            if planned:
+                self.requires[c.id] = tuple(dict.fromkeys(planned))
+            if alternatives:
+                self.alternatives[c.id] = tuple(alternatives)
+            if conditions:
+                self.conditions[c.id] = tuple(conditions)
+
+        self._closure = {}
+        self._close_all()
+        self.mandatory = tuple(
+            c.id
+            for c in classes
+            if c.is_mandatory and FIRST_YEAR <= (c.year or 0) <= LAST_YEAR
+        )
+        self.pathways = {}
+
+    @staticmethod
+    def _resolve(c, alternative, by_name):
+        """The class an alternative names, as seen from class c, or None."""
+        if isinstance(alternative, str):
+            return None
+        subject, year = alternative
+        candidates = [o for o in by_name.get(subject, ()) if o.id != c.id]
+        if year is not None and year < (c.year or 0):
+            matches = [o for o in candidates if o.year == year]
+            return matches[0].id if matches else None
+        # Nothing at or after this class's own year can be taken first, so
+        # "L2 English" on a Year 12 class means the latest earlier English
+        earlier = [o for o in candidates if (o.year or 0) < (c.year or 0)]
+        if earlier:
+            return earlier[-1].id
+        if year is None:
+            # Same-year classes count as co-requisites
+            same_year = [o for o in candidates if o.year == c.year]
+            return same_year[0].id if same_year else None
+        return None
+
+    def _close_all(self):
+        """Fill in every closure, one strongly connected component at a time.
+
+        Classes on a prerequisite cycle all need each other, so a cycle is
+        closed as a whole. Tarjan's algorithm finishes a component only
+        after everything it requires, so those closures are already there.
+        """
+        index = {}
+        low = {}
+        stack = []
+        on_stack = set()
+
+        def visit(class_id):
+            index[class_id] = low[class_id] = len(index)
+            stack.append(class_id)
+            on_stack.add(class_id)
+            for p in self.requires.get(class_id, ()):
+                if p not in index:
+                    visit(p)
+                    low[class_id] = min(low[class_id], low[p])
+                elif p in on_stack:
+                    low[class_id] = min(low[class_id], index[p])
+            if low[class_id] != index[class_id]:
+                return
+            component = []
+            while not component or component[-1] != class_id:
+                component.append(stack.pop())
+                on_stack.discard(component[-1])
+            needed = set()
+            for c in component:
+                for p in self.requires.get(c, ()):
+                    needed.add(p)
+                    # Members of this component aren't closed yet, but each
+                    # one is required by another, so they're all in already
+                    needed |= self._closure.get(p, frozenset())
+            for c in component:
+                self._closure[c] = frozenset(needed - {c})
+
+        for class_id in self.requires:
+            if class_id not in index:
+                visit(class_id)
+
+    def closure(self, class_id):
+        """Every class needed, directly or not, before class_id."""
+        return self._closure.get(class_id, frozenset())
+
+
+# ------------------- PATHWAYS -------------------
+def plan_pathway(catalog, job_id):
+    """Year 9-13 plan for a job: its classes, their prerequisite chains and mandatory classes.
+
+    Plans are kept on the snapshot's graph, so each job is planned once per
+    catalog version however many students ask.
+    """
+    graph = catalog.prerequisites
+    pathway = graph.pathways.get(job_id)
+    if pathway is None:
+        pathway = graph.pathways[job_id] = _plan(catalog, graph, job_id)
+    return pathway
+
+
+def _plan(catalog, graph, job_id):
+    reasons = {}
+    for c in catalog.classes_for_job(job_id):
+        reasons[c.id] = "job"
+    for class_id in list(reasons):
+        for p in graph.closure(class_id):
+            reasons.setdefault(p, "prerequisite")
+    for class_id in graph.mandatory:
+        reasons.setdefault(class_id, "mandatory")
+
+    years = {year: [] for year in range(FIRST_YEAR, LAST_YEAR + 1)}
+    unplaced = []
+    for class_id, reason in reasons.items():
+        c = catalog.classes[class_id]
+        entry = {
+            "id": c.id,
+            "name": c.name,
+            "year": c.year,
+            "is_mandatory": bool(c.is_mandatory),
+            "reason": reason,
+            "requires": list(graph.requires.get(c.id, ())),
+            "conditions": list(graph.conditions.get(c.id, ())),
+        }
+        if c.year in years:
+            years[c.year].append(entry)
+        else:
+            unplaced.append(entry)
+    for entries in years.values():
+        entries.sort(key=lambda e: ((e["name"] or "").lower(), e["id"]))
+    return {
+        "years": [
+            {"year": year, "classes": entries} for year, entries in years.items()
+        ],
+        "unplaced": unplaced,
+    }
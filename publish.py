@@ -0,0 +1,304 @@
+"""Rebuild the catalog off to the side, then publish it in one transaction.
+
+    python publish.py import FILE [--kind classes|jobs|links]
+    python publish.py snapshots
+    python publish.py rollback [SNAPSHOT]
+
+A rebuild works on a shadow copy of the catalog tables in its own file, so
+however long it takes the live database is neither locked nor half
+changed. Publishing validates the shadow, keeps a snapshot of the catalog
+it replaces and copies the shadow in inside a single write transaction:
+readers see the old catalog or the new one, never a mix, and every worker
+picks the new one up through catalog_version. The last few snapshots are
+kept, so a bad import is one rollback away.
+"""
+
+# ------------------- IMPORTS -------------------
+import argparse
+import os
+import sqlite3
+import time
+
+from catalog import bump_catalog_version
+from db import close_pools
+from importer import import_csv
+from migrations import migrate
+
+# ------------------- CONSTANTS -------------------
+# Parents before children when filling, the reverse when emptying
+CATALOG_TABLES = ["classes", "jobs", "job_classes"]
+KEEP_SNAPSHOTS = int(os.getenv("CATALOG_SNAPSHOTS", "5"))
+# Publishing a catalog with fewer than this share of the live rows needs force
+MIN_KEPT = 0.5
+LOCK_TIMEOUT = 30
+
+
+# ------------------- ERRORS -------------------
+class CatalogInvalid(ValueError):
+    """The rebuilt catalog failed validation; nothing was published."""
+
+
+class CatalogConflict(RuntimeError):
+    """The live catalog changed while the shadow was being rebuilt."""
+
+
+# ------------------- COPYING -------------------
+def _open(path):
+    # Plain connections: ATTACH state must not leak into the shared pools
+    return sqlite3.connect(path, isolation_level=None, timeout=LOCK_TIMEOUT)
+
+
+def _version(conn, schema="main"):
+    return conn.execute(f"SELECT version FROM {schema}.catalog_version").fetchone()[0]
+
+
+def _copy_tables(conn, source, target):
+    """Replace target's catalog tables with source's; run inside a transaction."""
+    for table in reversed(CATALOG_TABLES):
+        conn.execute(f"DELETE FROM {target}.{table}")
+    for table in CATALOG_TABLES:
+        columns = ", ".join(
+            row[1] for row in conn.execute(f"PRAGMA {target}.table_info({table})")
+        )
+        conn.execute(
+            f"INSERT INTO {target}.{table}({columns}) SELECT {columns} FROM {source}.{table}"
+        )
+
+
+def _counts(conn, schema="main"):
+    return {
+        table: conn.execute(f"SELECT COUNT(*) FROM {schema}.{table}").fetchone()[0]
+        for table in CATALOG_TABLES
+    }
+
+
+def copy_catalog(db_path, dest_path):
+    """New database file at dest_path holding db_path's catalog; returns its version."""
+    migrate(dest_path)
+    conn = _open(dest_path)
+    try:
+        conn.execute("ATTACH DATABASE ? AS live", (db_path,))
+        conn.execute("BEGIN")
+        # Read in the same transaction as the rows, so they agree
+        version = _version(conn, "live")
+        _copy_tables(conn, "live", "main")
+        conn.execute("UPDATE main.catalog_version SET version = ?", (version,))
+        conn.execute("COMMIT")
+        conn.execute("DETACH DATABASE live")
+        # One self-contained file, no -wal beside it
+        conn.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        conn.close()
+    return version
+
+
+def validate(path):
+    """Problems that would stop a catalog being published, if any."""
+    conn = _open(path)
+    try:
+        problems = []
+        check = conn.execute("PRAGMA quick_check").fetchone()[0]
+        if check != "ok":
+            problems.append(f"database check failed: {check}")
+        for table in ("classes", "jobs"):
+            blank = conn.execute(
+                f"SELECT COUNT(*) FROM {table} WHERE name IS NULL OR TRIM(name) = ''"
+            ).fetchone()[0]
+            if blank:
+                problems.append(f"{blank} {table} without a name")
+        duplicates = conn.execute("""
+            SELECT COUNT(*) FROM (
+                SELECT 1 FROM classes GROUP BY name, year HAVING COUNT(*) > 1
+            )
+        """).fetchone()[0]
+        if duplicates:
+            problems.append(f"{duplicates} classes listed twice for the same year")
+        dangling = conn.execute("""
+            SELECT COUNT(*) FROM job_classes
+            WHERE class_id NOT IN (SELECT id FROM classes)
+               OR job_id NOT IN (SELECT id FROM jobs)
+        """).fetchone()[0]
+        if dangling:
+            problems.append(f"{dangling} links to missing classes or jobs")
+        return problems
+    finally:
+        conn.close()
+
+
+def _publish(db_path, source_path, expected_version=None, force=False):
+    """Copy source_path's catalog over the live one in a single transaction."""
+    conn = _open(db_path)
+    try:
+        conn.execute("ATTACH DATABASE ? AS incoming", (source_path,))
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if expected_version is not None and _version(conn) != expected_version:
+                raise CatalogConflict(
+                    "the catalog changed while this one was being prepared; try again"
+                )
+            if not force:
+                live = _counts(conn)
+                incoming = _counts(conn, "incoming")
+                for table in CATALOG_TABLES:
+                    if incoming[table] < live[table] * MIN_KEPT:
+                        raise CatalogInvalid(
+                            f"{table} would shrink from {live[table]} to "
+                            f"{incoming[table]} rows; publish with force to allow it"
+                        )
+            _copy_tables(conn, "incoming", "main")
+            bump_catalog_version(conn)
+            version = _version(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("DETACH DATABASE incoming")
+    finally:
+        conn.close()
+    return version
+
+
+# ------------------- SNAPSHOTS -------------------
+def snapshot_dir(db_path):
+    return os.getenv("CATALOG_SNAPSHOT_DIR") or os.path.join(
+        os.path.dirname(os.path.abspath(db_path)), "catalog_snapshots"
+    )
+
+
+def take_snapshot(db_path):
+    """Save the live catalog as the newest snapshot; returns its version."""
+    folder = snapshot_dir(db_path)
+    os.makedirs(folder, exist_ok=True)
+    # Names sort oldest first; the version is there for people reading them
+    stem = f"catalog-{time.time_ns()}"
+    part = os.path.join(folder, stem + ".part")
+    try:
+        version = copy_catalog(db_path, part)
+        name = f"{stem}-v{version}.db"
+        os.replace(part, os.path.join(folder, name))
+    finally:
+        if os.path.exists(part):
+            os.unlink(part)
+    return version
+
+
+def prune_snapshots(db_path):
+    """Delete all but the newest KEEP_SNAPSHOTS snapshots."""
+    for name in list_snapshots(db_path)[KEEP_SNAPSHOTS:]:
+        os.unlink(os.path.join(snapshot_dir(db_path), name))
+
+
+def list_snapshots(db_path):
+    """Snapshot file names, newest first."""
+    folder = snapshot_dir(db_path)
+    if not os.path.isdir(folder):
+        return []
+    names = os.listdir(folder)
+    return sorted(
+        (n for n in names if n.startswith("catalog-") and n.endswith(".db")),
+        reverse=True,
+    )
+
+
+def rollback(db_path, name=None):
+    """Publish a snapshot, the newest by default; returns the new version.
+
+    The catalog being replaced is snapshotted first, so a rollback can be
+    undone the same way. The version still moves forward: old version
+    numbers are baked into immutable bundle URLs and ETags.
+    """
+    snapshots = list_snapshots(db_path)
+    if name is None:
+        if not snapshots:
+            raise FileNotFoundError("no catalog snapshots to roll back to")
+        name = snapshots[0]
+    elif name not in snapshots:
+        raise FileNotFoundError(f"no catalog snapshot called {name}")
+    path = os.path.join(snapshot_dir(db_path), name)
+    problems = validate(path)
+    if problems:
+        raise CatalogInvalid("; ".join(problems))
+    # Nothing may change between the safety copy and the swap
+    current = take_snapshot(db_path)
+    version = _publish(db_path, path, current, force=True)
+    prune_snapshots(db_path)
+    return version
+
+
+# ------------------- SHADOW -------------------
+class ShadowCatalog:
+    """Private copy of the live catalog to rebuild and then publish.
+
+        with ShadowCatalog(DB_PATH) as shadow:
+            import_csv(shadow.path, f)
+            shadow.publish()
+
+    The copy is deleted on the way out whether or not it was published.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.path = None
+        self.base_version = None
+
+    def __enter__(self):
+        folder = snapshot_dir(self.db_path)
+        os.makedirs(folder, exist_ok=True)
+        self.path = os.path.join(folder, f"shadow-{os.getpid()}-{time.time_ns()}.db")
+        self.base_version = copy_catalog(self.db_path, self.path)
+        return self
+
+    def __exit__(self, *exc):
+        # The importer borrowed pooled connections to the shadow file
+        close_pools(self.path)
+        for suffix in ("", "-wal", "-shm", "-journal"):
+            if os.path.exists(self.path + suffix):
+                os.unlink(self.path + suffix)
+
+    def publish(self, force=False):
+        """Validate, snapshot the live catalog and swap this one in.
+
+        Raises CatalogInvalid or CatalogConflict without touching the live
+        catalog. force allows a catalog much smaller than the live one.
+        """
+        close_pools(self.path)
+        problems = validate(self.path)
+        if problems:
+            raise CatalogInvalid("; ".join(problems))
+        take_snapshot(self.db_path)
+        version = _publish(self.db_path, self.path, self.base_version, force)
+        prune_snapshots(self.db_path)
+        return version
+
+
+# ------------------- MAIN -------------------
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=os.getenv("DB_PATH", "main.db"))
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_import = commands.add_parser("import", help="rebuild from a CSV and publish")
+    run_import.add_argument("file")
+    run_import.add_argument("--kind", choices=["classes", "jobs", "links"])
+    run_import.add_argument("--force", action="store_true")
+    commands.add_parser("snapshots", help="list snapshots, newest first")
+    run_rollback = commands.add_parser("rollback", help="publish a snapshot")
+    run_rollback.add_argument("snapshot", nargs="?")
+    args = parser.parse_args()
+
+    migrate(args.db)
+    if args.command == "import":
+        with ShadowCatalog(args.db) as shadow:
+            with open(args.file, encoding="utf-8-sig", newline="") as f:
+                result = import_csv(shadow.path, f, args.kind)
+            print(result)
+            if result.changed:
+                print(f"published catalog v{shadow.publish(args.force)}")
+    elif args.command == "snapshots":
+        for name in list_snapshots(args.db):
+            print(name)
+    else:
+        print(f"rolled back, now catalog v{rollback(args.db, args.snapshot)}")
+
+
+if __name__ == "__main__":
+    main()
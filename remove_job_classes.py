@@ -1,11 +1,19 @@
 import sqlite3
 import os
 
+from migrations import migrate
+from publish import ShadowCatalog
+
 DB_PATH = os.path.join(os.path.dirname(__file__), "main.db")
 
-with sqlite3.connect(DB_PATH) as conn:
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM job_classes")
-    conn.commit()
+migrate(DB_PATH)
+# Emptied in a shadow copy and published, so the old links stay in a
+# snapshot: `python publish.py rollback` puts them back
+with ShadowCatalog(DB_PATH) as shadow:
+    conn = sqlite3.connect(shadow.path)
+    with conn:
+        conn.execute("DELETE FROM job_classes")
+    conn.close()
+    shadow.publish(force=True)
 
 print("All job_classes have been removed.")
@@ -0,0 +1,49 @@
+# ------------------- IMPORTS -------------------
+import os
+import threading
+
+from cachetools import LRUCache
+from flask import render_template
+from markupsafe import Markup
+
+from metrics import RENDER_CACHE_LOOKUPS
+
+# ------------------- CONSTANTS -------------------
+# Budget in characters of rendered HTML, which is about bytes for our pages
+MAX_CHARS = int(os.getenv("RENDER_CACHE_CHARS", 32 * 1024 * 1024))
+
+
+# ------------------- CACHE -------------------
+class RenderCache:
+    """Rendered catalog fragments, evicted least recently used within a budget.
+
+    Fragments are keyed by template and entity and belong to one catalog
+    version. Nothing from an older catalog can be served again, so the
+    first render for a newer version empties the cache. Only fragments
+    that depend on the catalog alone belong here; anything about the
+    current user stays in the page around them, rendered every time.
+    """
+
+    def __init__(self, max_chars=MAX_CHARS):
+        self._entries = LRUCache(maxsize=max_chars, getsizeof=len)
+        self._version = None
+        self._lock = threading.Lock()
+
+    def render(self, template_name, key, version, build):
+        """Markup for template_name rendered with the context build() returns."""
+        cache_key = (template_name, key)
+        with self._lock:
+            if self._version is None or version > self._version:
+                self._entries.clear()
+                self._version = version
+            html = self._entries.get(cache_key) if version == self._version else None
+            if html is not None:
+                RENDER_CACHE_LOOKUPS.inc("hit")
+                return html
+            RENDER_CACHE_LOOKUPS.inc("miss")
+        html = Markup(render_template(template_name, **build()))
+        with self._lock:
+            # A request still holding an older snapshot renders, but never stores
+            if version == self._version and len(html) <= self._entries.maxsize:
+                self._entries[cache_key] = html
+        return html
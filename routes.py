@@ -1,6 +1,7 @@
 # ------------------- IMPORTS & CONFIG -------------------
 from flask import (
     Flask,
+    before_render_template,
     flash,
     redirect,
     render_template,
@@ -9,18 +10,63 @@ from flask import (
     url_for,
     abort,
     jsonify,
+    g,
+    make_response,
+    send_file,
+    template_rendered,
 )
 from dotenv import load_dotenv
-from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
-from flask_mail import Mail, Message
+from contextlib import contextmanager
 from functools import wraps
+from itertools import islice
 import colorama
-import sqlite3
+import hashlib
+import io
 import os
-import csv
 from pathlib import Path
 import random
+import time
+
+from avatars import MAX_UPLOAD_BYTES, AvatarStore, AvatarTooLarge, is_digest
+from catalog import (
+    bump_catalog_version,
+    class_dict,
+    get_catalog,
+    job_dict,
+    publish_link,
+    refresh_catalog,
+)
+from coverage import score_selection
+from db import get_pool
+from exports import FORMATS, READERS, export
+from facets import area_key, decode_cursor
+from hashing import HashingBusy, hash_password, verify_password
+from history import SearchHistory
+from httpcache import (
+    choose_encoding,
+    compress_response,
+    not_modified,
+    release_tag,
+    set_validators,
+)
+from importer import import_csv, upsert_classes, upsert_jobs
+from importjobs import ImportRunner, get_import, recent_imports
+from ingest import parse_salary
+from metrics import (
+    EMAIL_SECONDS,
+    finish_request,
+    finish_template,
+    render_all,
+    report_error,
+    start_request,
+    start_template,
+)
+from migrations import migrate
+from outbox import OutboxWorker, enqueue_email, queue_depth
+from prereqs import plan_pathway
+from publish import CatalogConflict, CatalogInvalid, list_snapshots, rollback
+from rendercache import RenderCache
 
 
 # ------------------- INITIALIZATION -------------------
@@ -32,27 +78,72 @@ load_dotenv(Path(".env"))
 key = os.getenv("KEY")
 app.secret_key = key
 app.config.update(
-    MAIL_SERVER="smtp.gmail.com",
-    MAIL_PORT=587,
+    MAIL_SERVER=os.getenv("MAIL_SERVER", "smtp.gmail.com"),
+    MAIL_PORT=int(os.getenv("MAIL_PORT", "587")),
     MAIL_USERNAME=os.getenv("USERNAME"),
     MAIL_PASSWORD=os.getenv("PASSWORD"),
-    MAIL_USE_TLS=True,
+    MAIL_USE_TLS=os.getenv("MAIL_USE_TLS", "true").lower() == "true",
     MAIL_USE_SSL=False,
 )
-mail = Mail(app)
+mail = None
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-DB_PATH = os.path.join(BASE_DIR, "main.db")
+DB_PATH = os.getenv("DB_PATH", os.path.join(BASE_DIR, "main.db"))
 app.config["UPLOAD_FOLDER"] = os.path.join(BASE_DIR, "static/images")
 app.config["DATA_FOLDER"] = os.path.join(BASE_DIR, "static/data")
-os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
-os.makedirs(app.config["DATA_FOLDER"], exist_ok=True)
-if not os.path.exists(DB_PATH):
-    open(DB_PATH, "a").close()
+app.config["AVATAR_FOLDER"] = os.getenv(
+    "AVATAR_FOLDER", os.path.join(BASE_DIR, "avatars")
+)
+# Refused with 413 before any of the body is read; catalog CSVs are the
+# biggest uploads, the avatar form sets its own lower limit
+app.config["MAX_CONTENT_LENGTH"] = int(
+    os.getenv("MAX_REQUEST_BYTES", 256 * 1024 * 1024)
+)
+# Set up by init_app, so importing this module never touches the disk
+avatar_store = None
+import_runner = None
+render_cache = RenderCache()
+app.after_request(compress_response)
+# Changes whenever the code or templates do, so a deploy invalidates ETags
+RELEASE = os.getenv("RELEASE") or release_tag(
+    __file__, os.path.join(BASE_DIR, "templates")
+)
+
+
+def init_app():
+    """Create the folders and database, migrate it and set up the stores.
+
+    serve.py, `python routes.py` and the benchmarks call this once before
+    serving; importing the module alone writes nothing.
+    """
+    global avatar_store, import_runner
+    if avatar_store is not None:
+        return app
+    os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
+    os.makedirs(app.config["DATA_FOLDER"], exist_ok=True)
+    if not os.path.exists(DB_PATH):
+        open(DB_PATH, "a").close()
+    migrate(DB_PATH)
+    avatar_store = AvatarStore(app.config["AVATAR_FOLDER"])
+    import_runner = ImportRunner(DB_PATH)
+    return app
+
 
 # ------------------- CONSTANTS -------------------
 SCHOOL_EMAIL_DOMAIN = "@burnside.school.nz"
+BUSY_MESSAGE = "Lots of people are logging in right now, try again in a moment."
 ADMIN_CODES = ["22298"]
+ADMIN_PAGE_SIZE = 50
+# Shown when the search box is empty
+SUGGESTED_RECENT = 5
+SUGGESTED_POPULAR = 5
+COVERAGE_MAX_SELECTIONS = 1000
+COVERAGE_MAX_LIMIT = 100
+AVATAR_MAX_AGE = 365 * 24 * 3600
+BUNDLE_MAX_AGE = 365 * 24 * 3600
+# Room for the multipart boundaries and headers around an avatar
+AVATAR_FORM_OVERHEAD = 64 * 1024
+AVATAR_TOO_BIG = "That picture is too big, please pick one under 5 MB"
 
 
 # ------------------- DECORATORS -------------------
@@ -68,126 +159,234 @@ def login_required(f):
     return decorated
 
 
+def catalog_cached(personal=False):
+    """Answer 304 while the client's copy matches the current catalog version.
+
+    Personal pages also show who is logged in (layout.html), so their ETag
+    covers the user too and they are only cached privately.
+    """
+
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            catalog = get_catalog(DB_PATH)
+            etag = f"{RELEASE}-{catalog.version}"
+            last_modified = catalog.updated_at
+            if personal:
+                who = f"{session.get('username')}:{session.get('pfp')}"
+                etag += "-" + hashlib.sha1(who.encode()).hexdigest()[:12]
+                last_modified = None
+                if "_flashes" in session:
+                    return f(*args, **kwargs)
+            if not_modified(etag, last_modified):
+                response = app.response_class(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            return set_validators(response, etag, last_modified, private=personal)
+
+        return decorated
+
+    return decorator
+
+
+def remember_search(f):
+    """Add the search term to the user's history, including on 304 answers.
+
+    Recording only appends to SearchHistory's buffer, so the search itself
+    never waits for the database.
+    """
+
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if request.method == "GET":
+            data = request.args
+        else:
+            data = request.get_json(silent=True) or {}
+        # Only signed-in searches count, so nobody can stuff the popular list
+        if "username" in session:
+            search_history.record(session["username"], data.get("term", ""))
+        return f(*args, **kwargs)
+
+    return decorated
+
+
+# ------------------- DATABASE CONNECTIONS -------------------
+def get_db(readonly=False):
+    """Pooled connection for the rest of this request.
+
+    Use `with get_db() as conn:` around writes so they commit.
+    """
+    key = "db_readonly" if readonly else "db"
+    if key not in g:
+        setattr(g, key, get_pool(DB_PATH, readonly).acquire())
+    return g.get(key)
+
+
+@app.teardown_appcontext
+def release_db(exc):
+    for readonly, key in ((True, "db_readonly"), (False, "db")):
+        conn = g.pop(key, None)
+        if conn is not None:
+            get_pool(DB_PATH, readonly).release(conn)
+
+
+# ------------------- INSTRUMENTATION -------------------
+@app.before_request
+def start_timing():
+    start_request()
+
+
+@app.after_request
+def finish_timing(response):
+    finish_request(request.endpoint, request.method, response.status_code)
+    return response
+
+
+@before_render_template.connect_via(app)
+def start_template_timing(sender, template, context, **extra):
+    start_template()
+
+
+@template_rendered.connect_via(app)
+def finish_template_timing(sender, template, context, **extra):
+    finish_template(template.name)
+
+
+@app.get("/metrics")
+def metrics():
+    """Request, SQL, template and email timings, and render cache lookups, for Prometheus."""
+    token = os.getenv("METRICS_TOKEN")
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        abort(404)
+    return (
+        render_all(),
+        200,
+        {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
+
+
 # ------------------- EMAIL -------------------
+def get_mail():
+    """Flask-Mail, imported the first time an email actually goes out."""
+    global mail
+    if mail is None:
+        from flask_mail import Mail
+
+        mail = Mail(app)
+    return mail
+
+
+@contextmanager
+def smtp_connection():
+    """One SMTP session for the outbox worker to send a batch over."""
+    from flask_mail import Message
+
+    with app.app_context(), get_mail().connect() as connection:
+
+        def send(recipient, subject, body):
+            result = "error"
+            start = time.perf_counter()
+            try:
+                connection.send(
+                    Message(
+                        subject=subject,
+                        sender=app.config["MAIL_USERNAME"],
+                        recipients=[recipient],
+                        body=body,
+                    )
+                )
+                result = "sent"
+            finally:
+                EMAIL_SECONDS.observe(time.perf_counter() - start, result)
+
+        yield send
+
+
+email_worker = OutboxWorker(DB_PATH, smtp_connection)
+search_history = SearchHistory(DB_PATH)
+
+
+def start_workers():
+    """Start this process's background threads.
+
+    Threads don't survive a fork, so serve.py calls this in every worker
+    it starts. The outbox then drains messages queued before a restart
+    without waiting for the next signup.
+    """
+    email_worker.start()
+    search_history.start()
+
+
 def send_email(user_email, key):
-    """Send verification email to Burnside students only."""
+    """Queue a verification email to Burnside students only."""
     if not user_email.lower().endswith(SCHOOL_EMAIL_DOMAIN):
         flash("Please use your Burnside school email!")
         return
-    msg = Message(
-        subject="Verify your email",
-        sender=app.config["MAIL_USERNAME"],
-        recipients=[user_email],
-        body=f"Confirm your email by clicking: http://127.0.0.1:5000/verify/{key}",
-    )
-    mail.send(msg)
+    with get_db() as conn:
+        enqueue_email(
+            conn,
+            user_email,
+            "Verify your email",
+            f"Confirm your email by clicking: http://127.0.0.1:5000/verify/{key}",
+        )
+    email_worker.start()
+    email_worker.wake()
 
 
 # ------------------- DATABASE FUNCTIONS -------------------
 def add_class(name, years, is_mandatory=False, prerequisites=None):
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        for year in years:
-            cursor.execute(
-                "SELECT id FROM classes WHERE name=? AND year=?", (name, year)
-            )
-            existing = cursor.fetchone()
-            if existing:
-                cursor.execute(
-                    "UPDATE classes SET name=?, year=?, is_mandatory=?, prerequisites=? WHERE id=?",
-                    (name, year, is_mandatory, prerequisites, existing[0]),
-                )
-            else:
-                cursor.execute(
-                    "INSERT INTO classes(name, year, is_mandatory, prerequisites) VALUES(?,?,?,?)",
-                    (name, year, is_mandatory, prerequisites),
-                )
-        conn.commit()
+    result = upsert_classes(
+        DB_PATH,
+        [(name, year, int(bool(is_mandatory)), prerequisites) for year in years],
+    )
+    refresh_catalog(DB_PATH)
+    return result
+
+
+def import_catalog_file(file_name, kind=None):
+    """Import a catalog CSV in any layout ingest.CatalogCsv recognises."""
+    with open(file_name, "r", encoding="utf-8-sig", newline="") as f:
+        result = import_csv(DB_PATH, f, kind)
+    refresh_catalog(DB_PATH)
+    return result
 
 
 def add_classes_from_file(file_name):
-    with open(file_name, "r", encoding="utf-8") as f:
-        reader = csv.reader(f)
-        header = next(reader)
-        for line in reader:
-            name, years_range, is_mandatory, prerequisites = line
-            years = (
-                list(
-                    range(
-                        int(years_range.split("-")[0]),
-                        int(years_range.split("-")[1]) + 1,
-                    )
-                )
-                if "-" in years_range
-                else [int(years_range)]
-            )
-            add_class(
-                name, years, is_mandatory.strip().lower() == "true", prerequisites
-            )
+    return import_catalog_file(file_name)
 
 
 def add_job(name, salary_avg, area):
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT id FROM jobs WHERE name=?", (name,))
-        existing = cursor.fetchone()
-        if existing:
-            cursor.execute(
-                "UPDATE jobs SET salary_avg=?, area=? WHERE id=?",
-                (salary_avg, area, existing[0]),
-            )
-        else:
-            cursor.execute(
-                "INSERT INTO jobs(name, salary_avg, area) VALUES(?,?,?)",
-                (name, salary_avg, area),
-            )
-        conn.commit()
+    # salary_avg is an INTEGER column; "$95,000" and "95000" both arrive here
+    if salary_avg in (None, ""):
+        salary_avg = None
+    elif not isinstance(salary_avg, int):
+        salary_avg = parse_salary(str(salary_avg))
+    result = upsert_jobs(DB_PATH, [(name, salary_avg, area)])
+    refresh_catalog(DB_PATH)
+    return result
 
 
 def add_jobs_from_file(file_name):
-    with open(file_name, "r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            name = row.get("name", "").strip()
-            avg_salary = row.get("avg_salary", "0").strip()
-            area = row.get("area", "").strip()
-            if not name or not avg_salary:
-                continue
-            try:
-                avg_salary = int(avg_salary)
-            except:
-                avg_salary = 0
-            add_job(name, avg_salary, area)
+    return import_catalog_file(file_name)
 
 
 def add_job_classes_from_file(file_name):
-    with open(file_name, "r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            class_id = row.get("class_id")
-            jobs_str = row.get("jobs", "")
-            if not class_id or not jobs_str:
-                continue
-            job_names = [j.strip() for j in jobs_str.split(";") if j.strip()]
-            with sqlite3.connect(DB_PATH) as conn:
-                cursor = conn.cursor()
-                for job_name in job_names:
-                    cursor.execute(
-                        "SELECT id FROM jobs WHERE LOWER(name)=?", (job_name.lower(),)
-                    )
-                    job_row = cursor.fetchone()
-                    if job_row:
-                        job_id = job_row[0]
-                        cursor.execute(
-                            "INSERT OR IGNORE INTO job_classes(class_id, job_id) VALUES (?, ?)",
-                            (class_id, job_id),
-                        )
-                conn.commit()
+    return import_catalog_file(file_name, kind="links")
 
 
 def add_all_high_school_classes_job_classes():
     file_path = os.path.join(app.config["DATA_FOLDER"], "all_high_school_classes.csv")
-    add_job_classes_from_file(file_path)
+    return add_job_classes_from_file(file_path)
+
+
+def start_import(file, kind=None):
+    """Hand an uploaded CSV to the background importer; returns the job id."""
+    # Werkzeug has already spooled the upload, so the runner reads that copy
+    # directly. Swap in a dummy so closing the request doesn't close it.
+    stream, file.stream = file.stream, io.BytesIO()
+    return import_runner.submit(stream, secure_filename(file.filename), kind)
 
 
 # ------------------- ROUTES -------------------
@@ -216,7 +415,7 @@ def signup():
         elif len(code) != 5 or not code.isdigit():
             error = "Invalid student ID"
         else:
-            conn = sqlite3.connect("main.db")
+            conn = get_db()
             cursor = conn.cursor()
             cursor.execute(
                 "SELECT * FROM users WHERE username = ? OR code = ?",
@@ -230,18 +429,25 @@ def signup():
                 error = "username too long"
             else:
                 key = random.randint(1000000000, 1000000000000000000)
-                hashed_password = generate_password_hash(password)
+                try:
+                    hashed_password = hash_password(password)
+                except HashingBusy:
+                    return (
+                        render_template(
+                            "signup.html", header="signup", error=BUSY_MESSAGE
+                        ),
+                        503,
+                        {"Retry-After": "2"},
+                    )
                 sql = "INSERT INTO users(username, password, code, email, key, is_verified) VALUES(?,?,?,?,?,?)"
                 cursor.execute(
                     sql, (username, hashed_password, code, email, key, False)
                 )
                 conn.commit()
-                conn.close()
                 send_email(email, key)
                 return render_template(
                     "login.html", header="login", error="check your email."
                 )
-            conn.close()
 
     return render_template("signup.html", header="signup", error=error)
 
@@ -253,31 +459,89 @@ def account():
     if request.method == "GET":
         return render_template("account.html", header="account")
 
+    request.max_content_length = MAX_UPLOAD_BYTES + AVATAR_FORM_OVERHEAD
     if "file" not in request.files:
         flash("No file part")
         return redirect(request.url)
 
     file = request.files["file"]
-    filename = secure_filename(file.filename)
 
     # Check if a file was selected and is not empty
-    if filename and file and file.filename != "":
-        file.save(os.path.join(app.config["UPLOAD_FOLDER"], filename))
-
-        conn = sqlite3.connect("main.db")
-        cursor = conn.cursor()
-        sql = "UPDATE users SET pfp = ? WHERE username = ?"
-        cursor.execute(sql, (filename, session["username"]))
-        conn.commit()
-        conn.close()
-
-        session["pfp"] = filename
+    if file and file.filename != "":
+        try:
+            digest = avatar_store.save_upload(file.stream)
+        except AvatarTooLarge:
+            flash(AVATAR_TOO_BIG)
+            return redirect(request.url)
+
+        with get_db() as conn:
+            sql = "UPDATE users SET pfp = ? WHERE username = ?"
+            conn.execute(sql, (digest, session["username"]))
+
+        session["pfp"] = digest
         return redirect(url_for("home"))
     else:
         flash("No file selected")
         return redirect(request.url)
 
 
+@app.get("/avatar/<digest>")
+def avatar(digest):
+    """Serve a stored profile picture, preferring the small WebP variant."""
+    if not is_digest(digest):
+        abort(404)
+    found = avatar_store.find(digest, "image/webp" in request.accept_mimetypes)
+    if found is None:
+        abort(404)
+    path, mimetype, final = found
+    if not final:
+        # Still being resized; don't let anyone cache the full-size original
+        response = send_file(path, mimetype=mimetype, conditional=True, etag=digest)
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+    # The URL names the content, so a variant never changes once written
+    response = send_file(
+        path,
+        mimetype=mimetype,
+        conditional=True,
+        etag=f"{digest}-{os.path.splitext(path)[1][1:]}",
+        max_age=AVATAR_MAX_AGE,
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.vary.add("Accept")
+    return response
+
+
+@app.template_global()
+def avatar_url(pfp):
+    if is_digest(pfp):
+        return url_for("avatar", digest=pfp)
+    return url_for("static", filename="images/" + pfp if pfp else "default_pfp.png")
+
+
+def adopt_legacy_avatar(username, pfp):
+    """Move a picture uploaded before the avatar store into it.
+
+    A picture the store won't take, like one over the upload limit, stays
+    where it is and keeps being served from static/images.
+    """
+    path = os.path.join(app.config["UPLOAD_FOLDER"], secure_filename(pfp or ""))
+    if is_digest(pfp) or not pfp or not os.path.isfile(path):
+        return pfp
+    try:
+        digest = avatar_store.adopt(path)
+    except AvatarTooLarge:
+        report_error("avatars", f"legacy picture {pfp} is over the upload limit")
+        return pfp
+    except OSError as e:
+        report_error("avatars", f"legacy picture {pfp}: {e}")
+        return pfp
+    with get_db() as conn:
+        conn.execute("UPDATE users SET pfp = ? WHERE username = ?", (digest, username))
+    return digest
+
+
 @app.route("/login", methods=["GET", "POST"])
 def login():
     """User login route with session management."""
@@ -286,23 +550,29 @@ def login():
         username = request.form["username"]
         password = request.form["password"]
 
-        conn = sqlite3.connect("main.db")
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
+        cursor = get_db(readonly=True).execute(
+            "SELECT * FROM users WHERE username = ?", (username,)
+        )
         user = cursor.fetchone()
-        conn.close()
-
-        if user is None:
-            error = "User not found or Not Verified."
-        elif user[5] == 0:  # is_verified check
-            error = "Not verified. Check your email!"
-        elif check_password_hash(user[2], password):  # hashed password
-            session["username"] = username
-            session["pfp"] = user[6]  # pfp assumed at index 6
-            session["code"] = user[4]
-            return redirect(url_for("home"))
-        else:
-            error = "Incorrect password."
+
+        try:
+            if user is None:
+                error = "User not found or Not Verified."
+            elif user[5] == 0:  # is_verified check
+                error = "Not verified. Check your email!"
+            elif verify_password(user[2], password):  # hashed password
+                session["username"] = username
+                session["pfp"] = adopt_legacy_avatar(username, user[6])
+                session["code"] = user[4]
+                return redirect(url_for("home"))
+            else:
+                error = "Incorrect password."
+        except HashingBusy:
+            return (
+                render_template("login.html", header="login", error=BUSY_MESSAGE),
+                503,
+                {"Retry-After": "2"},
+            )
 
     return render_template("login.html", header="login", error=error)
 
@@ -316,38 +586,133 @@ def logout():
 @app.get("/admin")
 @login_required
 def admin():
+    """Catalog editor, one keyset page of classes at a time."""
     if session.get("code") not in ADMIN_CODES:
         abort(404)
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT id,name,year,is_mandatory,prerequisites FROM classes ORDER BY name, year"
+    name = request.args.get("name", "").strip().lower()
+    year = request.args.get("year", type=int)
+    mandatory = request.args.get("mandatory", "")
+    after = request.args.get("after", type=int)
+
+    def matches(c):
+        if name and name not in (c.name or "").lower():
+            return False
+        if year is not None and c.year != year:
+            return False
+        if mandatory and bool(c.is_mandatory) != (mandatory == "yes"):
+            return False
+        return True
+
+    catalog = get_catalog(DB_PATH)
+    # One extra row tells us whether there is a next page
+    page = list(
+        islice(filter(matches, catalog.classes_after(after)), ADMIN_PAGE_SIZE + 1)
+    )
+    next_after = page[ADMIN_PAGE_SIZE - 1].id if len(page) > ADMIN_PAGE_SIZE else None
+
+    def row_context(c):
+        jobs = sorted(set(catalog.jobs_by_class.get(c.id, ())))
+        return {
+            "subject": {
+                "id": c.id,
+                "name": c.name,
+                "year": c.year,
+                "is_mandatory": c.is_mandatory,
+                "prerequisites": c.prerequisites,
+                "jobs": [(j, catalog.jobs[j].name) for j in jobs],
+            }
+        }
+
+    # Rows only change with the catalog, so each is rendered once per version
+    rows = [
+        render_cache.render(
+            "admin_row.html", c.id, catalog.version, lambda c=c: row_context(c)
         )
-        classes = cursor.fetchall()
-        subjects = []
-        for c in classes:
-            cursor.execute(
-                "SELECT id,name FROM jobs WHERE id IN (SELECT job_id FROM job_classes WHERE class_id=?)",
-                (c[0],),
-            )
-            jobs = cursor.fetchall()
-            subjects.append(
-                {
-                    "id": c[0],
-                    "name": c[1],
-                    "year": c[2],
-                    "is_mandatory": c[3],
-                    "prerequisites": c[4],
-                    "jobs": jobs,
-                }
-            )
-        cursor.execute("SELECT id,name FROM jobs ORDER BY name")
-        jobs = cursor.fetchall()
+        for c in page[:ADMIN_PAGE_SIZE]
+    ]
     return render_template(
-        "admin.html", header="Admin", subjects=subjects, all_jobs=jobs
+        "admin.html",
+        header="Admin",
+        rows=rows,
+        imports=recent_imports(DB_PATH),
+        snapshots=list_snapshots(DB_PATH),
+        filters={"name": name, "year": year, "mandatory": mandatory},
+        next_after=next_after,
+        is_first_page=after is None,
     )
 
 
+@app.get("/admin/outbox")
+@login_required
+def outbox_status():
+    """Verification emails still queued, for keeping an eye on the relay."""
+    if session.get("code") not in ADMIN_CODES:
+        abort(404)
+    return jsonify(queue_depth(DB_PATH))
+
+
+@app.get("/admin/imports")
+@login_required
+def import_list():
+    """Latest catalog imports, polled by the admin page while one runs."""
+    if session.get("code") not in ADMIN_CODES:
+        abort(404)
+    return jsonify(recent_imports(DB_PATH))
+
+
+@app.get("/admin/imports/<int:job_id>")
+@login_required
+def import_status(job_id):
+    if session.get("code") not in ADMIN_CODES:
+        abort(404)
+    job = get_import(DB_PATH, job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job)
+
+
+@app.get("/admin/export/<table>.<fmt>")
+@login_required
+def catalog_export(table, fmt):
+    """Download a catalog table as CSV that imports back in, or as NDJSON.
+
+    The body is generated while it is sent, so a catalog of any size
+    starts downloading at once and never sits in memory whole.
+    """
+    if session.get("code") not in ADMIN_CODES:
+        abort(404)
+    if table not in READERS or fmt not in FORMATS:
+        abort(404)
+    response = app.response_class(export(DB_PATH, table, fmt), mimetype=FORMATS[fmt])
+    response.headers["Content-Disposition"] = f"attachment; filename={table}.{fmt}"
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+
+@app.get("/admin/snapshots")
+@login_required
+def catalog_snapshots():
+    """Saved catalogs that can be rolled back to, newest first."""
+    if session.get("code") not in ADMIN_CODES:
+        abort(404)
+    return jsonify(list_snapshots(DB_PATH))
+
+
+@app.post("/admin/rollback")
+@login_required
+def catalog_rollback():
+    """Put a saved catalog back, by default the one the last publish replaced."""
+    if session.get("code") not in ADMIN_CODES:
+        abort(404)
+    try:
+        version = rollback(DB_PATH, request.form.get("snapshot") or None)
+        flash(f"Catalog rolled back, now version {version}.")
+    except (FileNotFoundError, CatalogInvalid, CatalogConflict) as e:
+        flash(f"Rollback failed: {e}")
+    refresh_catalog(DB_PATH)
+    return redirect(url_for("admin"))
+
+
 @app.post("/update-classes")
 def update_classes():
     """Update classes from uploaded CSV file."""
@@ -359,9 +724,8 @@ def update_classes():
     filename = secure_filename(file.filename)
 
     if filename and file and file.filename != "":
-        file.save(os.path.join(app.config["DATA_FOLDER"], filename))
-        add_classes_from_file(os.path.join(app.config["DATA_FOLDER"], filename))
-        flash("Classes updated successfully!")
+        start_import(file)
+        flash("Classes import started.")
         return redirect(url_for("admin"))
     else:
         flash("No file selected")
@@ -371,10 +735,13 @@ def update_classes():
 @app.route("/import-job-classes")
 @login_required
 def import_job_classes():
+    file_path = os.path.join(app.config["DATA_FOLDER"], "all_high_school_classes.csv")
     try:
-        add_all_high_school_classes_job_classes()
-        flash("Job-class relationships imported successfully!")
-    except Exception as e:
+        import_runner.submit(
+            open(file_path, "rb"), os.path.basename(file_path), kind="links"
+        )
+        flash("Job-class relationships import started.")
+    except OSError as e:
         flash(f"Error importing job-class relationships: {e}")
     return redirect(url_for("admin"))
 
@@ -390,9 +757,8 @@ def update_jobs():
     filename = secure_filename(file.filename)
 
     if filename and file and file.filename != "":
-        file.save(os.path.join(app.config["DATA_FOLDER"], filename))
-        add_jobs_from_file(os.path.join(app.config["DATA_FOLDER"], filename))
-        flash("jobs updated successfully!")
+        start_import(file)
+        flash("Jobs import started.")
         return redirect(url_for("admin"))
     else:
         flash("No file selected")
@@ -404,9 +770,9 @@ def update_jobs():
 def import_bulk_jobs():
     file_path = os.path.join(app.config["DATA_FOLDER"], "jobs_bulk.csv")
     try:
-        add_jobs_from_file(file_path)
-        flash("400 jobs imported successfully!")
-    except Exception as e:
+        import_runner.submit(open(file_path, "rb"), os.path.basename(file_path))
+        flash("Jobs import started.")
+    except OSError as e:
         flash(f"Error importing jobs: {e}")
     return redirect(url_for("admin"))
 
@@ -421,11 +787,14 @@ def subject_selection():
 def add_job_to_class(class_id, job_id):
     if session.get("code") not in ADMIN_CODES:
         abort(404)
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute(
+    with get_db() as conn:
+        cursor = conn.execute(
             "INSERT OR IGNORE INTO job_classes(class_id, job_id) VALUES(?,?)",
             (class_id, job_id),
         )
+        changed = bump_catalog_version(conn) if cursor.rowcount else None
+    if changed:
+        publish_link(DB_PATH, class_id, job_id, True, *changed)
     return redirect(url_for("admin"))
 
 
@@ -433,172 +802,324 @@ def add_job_to_class(class_id, job_id):
 def remove_job_from_class(class_id, job_id):
     if session.get("code") not in ADMIN_CODES:
         abort(404)
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute(
+    with get_db() as conn:
+        cursor = conn.execute(
             "DELETE FROM job_classes WHERE class_id=? AND job_id=?", (class_id, job_id)
         )
+        changed = bump_catalog_version(conn) if cursor.rowcount else None
+    if changed:
+        publish_link(DB_PATH, class_id, job_id, False, *changed)
     return redirect(url_for("admin"))
 
 
 # ------------------- SEARCH -------------------
-@app.route("/subject-search", methods=["POST"])
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+
+
+def class_result(catalog, c):
+    return {
+        "type": "class",
+        **class_dict(c),
+        "jobs": [job_dict(j) for j in catalog.jobs_for_class(c.id)],
+    }
+
+
+def job_result(catalog, j):
+    return {
+        "type": "job",
+        **job_dict(j),
+        "classes": [class_dict(c) for c in catalog.classes_for_job(j.id)],
+    }
+
+
+@app.route("/subject-search", methods=["GET", "POST"])
+@remember_search
+@catalog_cached()
 def subject_search():
-    data = request.get_json()
+    # GET lets browsers revalidate instead of re-sending the search
+    data = request.args if request.method == "GET" else request.get_json()
     term = data.get("term", "").strip().lower()
-    results = []
+    catalog = get_catalog(DB_PATH)
+
+    # Only the first match is shown, so stop looking once one is found
+    c = next(catalog.match_classes(term), None)
+    if c is not None:
+        return jsonify(class_result(catalog, c))
+    j = next(catalog.match_jobs(term), None)
+    if j is not None:
+        return jsonify(job_result(catalog, j))
+    return jsonify({"type": "none"})
+
+
+@app.get("/search-history")
+def search_suggestions():
+    """The user's recent searches and the popular items, for the empty search box.
+
+    Fetched once per page rather than embedded, so the cached subject pages
+    never carry a stale history.
+    """
+    username = session.get("username")
+    recent = search_history.recent(username, SUGGESTED_RECENT) if username else []
+    popular = [item["name"] for item in search_history.popular()]
+    response = jsonify({"recent": recent, "popular": popular[:SUGGESTED_POPULAR]})
+    response.cache_control.no_store = True
+    return response
+
+
+@app.post("/search-history")
+def record_search():
+    """Searches the browser answered from the catalog bundle, sent as a beacon."""
+    if "username" not in session:
+        return "", 401
+    search_history.record(session["username"], request.form.get("term", ""))
+    return "", 204
+
+
+@app.get("/subject-search/results")
+@catalog_cached()
+def subject_search_results():
+    """Every class and job match for a term, a page at a time."""
+    term = request.args.get("term", "").strip().lower()
+    page = max(request.args.get("page", 1, type=int), 1)
+    per_page = request.args.get("per_page", SEARCH_PAGE_SIZE, type=int)
+    per_page = min(max(per_page, 1), SEARCH_MAX_PAGE_SIZE)
+    catalog = get_catalog(DB_PATH)
+
+    classes = list(catalog.match_classes(term))
+    jobs = list(catalog.match_jobs(term))
+    start = (page - 1) * per_page
+    end = start + per_page
+
+    # Classes come before jobs, same as the single-result search
+    results = [class_result(catalog, c) for c in classes[start:end]]
+    results += [
+        job_result(catalog, j)
+        for j in jobs[max(start - len(classes), 0) : max(end - len(classes), 0)]
+    ]
+    return jsonify(
+        {
+            "term": term,
+            "page": page,
+            "per_page": per_page,
+            "total": len(classes) + len(jobs),
+            "results": results,
+        }
+    )
 
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
 
-        # Search classes
-        cursor.execute(
-            "SELECT id, name, year, is_mandatory FROM classes WHERE LOWER(name)=? OR LOWER(name) LIKE ? ORDER BY name",
-            (term, f"%{term}%"),
-        )
-        classes = cursor.fetchall()
-        for c in classes:
-            cursor.execute(
-                """
-                SELECT j.id, j.name FROM jobs j
-                JOIN job_classes jc ON jc.job_id = j.id
-                WHERE jc.class_id = ?
-            """,
-                (c[0],),
-            )
-            jobs = cursor.fetchall()
-            results.append(
-                {
-                    "type": "class",
-                    "id": c[0],
-                    "name": c[1],
-                    "year": c[2],
-                    "is_mandatory": bool(c[3]),
-                    "jobs": [{"id": j[0], "name": j[1]} for j in jobs],
-                }
-            )
+# ------------------- JOB BROWSING -------------------
+BROWSE_PAGE_SIZE = 20
+BROWSE_MAX_PAGE_SIZE = 100
 
-        # Search jobs
-        cursor.execute(
-            "SELECT id, name FROM jobs WHERE LOWER(name)=? OR LOWER(name) LIKE ? ORDER BY name",
-            (term, f"%{term}%"),
-        )
-        jobs = cursor.fetchall()
-        for j in jobs:
-            cursor.execute(
-                """
-                SELECT c.id, c.name, c.year, c.is_mandatory FROM classes c
-                JOIN job_classes jc ON jc.class_id = c.id
-                WHERE jc.job_id = ?
-            """,
-                (j[0],),
-            )
-            classes_for_job = cursor.fetchall()
-            results.append(
-                {
-                    "type": "job",
-                    "id": j[0],
-                    "name": j[1],
-                    "classes": [
-                        {
-                            "id": c[0],
-                            "name": c[1],
-                            "year": c[2],
-                            "is_mandatory": bool(c[3]),
-                        }
-                        for c in classes_for_job
-                    ],
-                }
+
+def job_facet_dict(j):
+    return {**job_dict(j), "salary_avg": j.salary_avg, "area": j.area}
+
+
+def salary_range():
+    return (
+        request.args.get("min_salary", type=int),
+        request.args.get("max_salary", type=int),
+    )
+
+
+@app.get("/jobs/browse")
+@catalog_cached()
+def browse_jobs():
+    """Jobs filtered by area and salary range, cheapest first, a page at a time.
+
+    Pass the returned next cursor back as after for the following page.
+    """
+    area = request.args.get("area", "").strip()
+    min_salary, max_salary = salary_range()
+    per_page = request.args.get("per_page", BROWSE_PAGE_SIZE, type=int)
+    per_page = min(max(per_page, 1), BROWSE_MAX_PAGE_SIZE)
+    after = request.args.get("after")
+    if after:
+        try:
+            after = decode_cursor(after)
+        except ValueError:
+            return (
+                jsonify({"error": "after must be a cursor from a previous page"}),
+                400,
             )
+    else:
+        after = None
 
-    if not results:
-        return jsonify({"type": "none"})
-    return jsonify(results[0])  # Return the first match so frontend displays something
+    page = get_catalog(DB_PATH).facets.browse(
+        area, min_salary, max_salary, after, per_page
+    )
+    return jsonify(
+        {
+            "area": area or None,
+            "min_salary": min_salary,
+            "max_salary": max_salary,
+            "per_page": per_page,
+            "total": page["total"],
+            "next": page["next"],
+            "jobs": [job_facet_dict(j) for j in page["jobs"]],
+        }
+    )
+
+
+@app.get("/jobs/facets")
+@catalog_cached()
+def job_facets():
+    """Sidebar counts: jobs per area in the salary range, and the area's salary bands."""
+    area = area_key(request.args.get("area"))
+    min_salary, max_salary = salary_range()
+    facets = get_catalog(DB_PATH).facets
+    return jsonify(
+        {
+            "areas": facets.area_counts(min_salary, max_salary),
+            "salaries": list(facets.histograms.get(area or None, ())),
+        }
+    )
 
 
 # ------------------- CLASS/JOB BY ID -------------------
 @app.route("/subject/<int:class_id>")
+@catalog_cached(personal=True)
 def subject_by_id(class_id):
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT id, name, year, is_mandatory FROM classes WHERE id = ?", (class_id,)
-        )
-        class_ = cursor.fetchone()
-        if not class_:
-            return render_template("404.html"), 404
-        cursor.execute(
-            """
-            SELECT j.id, j.name FROM jobs j
-            JOIN job_classes jc ON jc.job_id = j.id
-            WHERE jc.class_id = ?
-        """,
-            (class_id,),
-        )
-        jobs = cursor.fetchall()
-    return render_template(
-        "subject_selection.html",
-        header="Subject Selection",
-        selected_class={
-            "id": class_[0],
-            "name": class_[1],
-            "year": class_[2],
-            "is_mandatory": class_[3],
+    catalog = get_catalog(DB_PATH)
+    class_ = catalog.classes.get(class_id)
+    if not class_:
+        return render_template("404.html"), 404
+    results = render_cache.render(
+        "subject_results.html",
+        ("class", class_id),
+        catalog.version,
+        lambda: {
+            "selected_class": {
+                "id": class_.id,
+                "name": class_.name,
+                "year": class_.year,
+                "is_mandatory": class_.is_mandatory,
+            },
+            "jobs": [job_dict(j) for j in catalog.jobs_for_class(class_id)],
         },
-        jobs=[{"id": j[0], "name": j[1]} for j in jobs],
+    )
+    return render_template(
+        "subject_selection.html", header="Subject Selection", results=results
     )
 
 
 @app.route("/subject/job/<int:job_id>")
+@catalog_cached(personal=True)
 def subject_by_job_id(job_id):
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, name FROM jobs WHERE id = ?", (job_id,))
-        job = cursor.fetchone()
-        if not job:
-            return render_template("404.html"), 404
-        cursor.execute(
-            """
-            SELECT c.id, c.name, c.year, c.is_mandatory FROM classes c
-            JOIN job_classes jc ON jc.class_id = c.id
-            WHERE jc.job_id = ?
-            ORDER BY c.year
-        """,
-            (job_id,),
-        )
-        classes = cursor.fetchall()
+    catalog = get_catalog(DB_PATH)
+    job = catalog.jobs.get(job_id)
+    if not job:
+        return render_template("404.html"), 404
+    results = render_cache.render(
+        "subject_results.html",
+        ("job", job_id),
+        catalog.version,
+        lambda: {
+            "selected_job": job_dict(job),
+            "classes": [
+                {
+                    "id": c.id,
+                    "name": c.name,
+                    "year": c.year,
+                    "is_mandatory": c.is_mandatory,
+                }
+                for c in sorted(catalog.classes_for_job(job_id), key=lambda c: c.year)
+            ],
+        },
+    )
     return render_template(
-        "subject_selection.html",
-        header="Subject Selection",
-        selected_job={"id": job[0], "name": job[1]},
-        classes=[
-            {"id": c[0], "name": c[1], "year": c[2], "is_mandatory": c[3]}
-            for c in classes
-        ],
+        "subject_selection.html", header="Subject Selection", results=results
     )
 
 
+@app.get("/pathway/job/<int:job_id>")
+@catalog_cached()
+def job_pathway(job_id):
+    """Year 9-13 classes for a job, prerequisite chains included, as JSON."""
+    catalog = get_catalog(DB_PATH)
+    job = catalog.jobs.get(job_id)
+    if not job:
+        abort(404)
+    return jsonify({"job": job_dict(job), **plan_pathway(catalog, job_id)})
+
+
+@app.post("/coverage")
+def selection_coverage():
+    """Score many students' class selections against every job in one request.
+
+    Body: {"selections": [{"id": "student", "classes": [class ids]}, ...],
+    "limit": jobs per student}. A selection may also be a bare list of ids.
+    """
+    data = request.get_json(silent=True) or {}
+    selections = data.get("selections")
+    if not isinstance(selections, list) or len(selections) > COVERAGE_MAX_SELECTIONS:
+        return (
+            jsonify(
+                {
+                    "error": f"selections must be a list of at most {COVERAGE_MAX_SELECTIONS}"
+                }
+            ),
+            400,
+        )
+    limit = data.get("limit", SEARCH_PAGE_SIZE)
+    if not isinstance(limit, int):
+        limit = SEARCH_PAGE_SIZE
+    limit = min(max(limit, 1), COVERAGE_MAX_LIMIT)
+
+    catalog = get_catalog(DB_PATH)
+    results = []
+    for i, selection in enumerate(selections):
+        if isinstance(selection, dict):
+            key, classes = selection.get("id", i), selection.get("classes")
+        else:
+            key, classes = i, selection
+        if not isinstance(classes, list):
+            classes = []
+        results.append({"id": key, **score_selection(catalog, classes, limit)})
+    return jsonify({"version": catalog.version, "results": results})
+
+
+@app.get("/catalog/<int:version>.json")
+def catalog_bundle(version):
+    """Every class, job and link in one download, for searching in the browser."""
+    catalog = get_catalog(DB_PATH)
+    if version != catalog.version:
+        return redirect(url_for("catalog_bundle", version=catalog.version))
+    etag = f"catalog-{version}"
+    if not_modified(etag):
+        response = app.response_class(status=304)
+    else:
+        bundle = catalog.bundle
+        encoding = choose_encoding()
+        response = app.response_class(
+            bundle.body(encoding), mimetype="application/json"
+        )
+        if encoding in bundle.encodings:
+            response.headers["Content-Encoding"] = encoding
+    # A version's contents never change, only which version is current
+    response.set_etag(etag, weak=True)
+    response.vary.add("Accept-Encoding")
+    response.cache_control.public = True
+    response.cache_control.max_age = BUNDLE_MAX_AGE
+    response.cache_control.immutable = True
+    return response
+
+
+@app.template_global()
+def catalog_bundle_url():
+    return url_for("catalog_bundle", version=get_catalog(DB_PATH).version)
+
+
 @app.route("/class-suggestions")
+@catalog_cached()
 def class_suggestions():
     term = request.args.get("term", "").strip().lower()
     suggestions = []
 
     if term:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-
-            # Classes
-            cursor.execute(
-                "SELECT DISTINCT name FROM classes WHERE LOWER(name) LIKE ? ORDER BY name LIMIT 5",
-                (f"%{term}%",),
-            )
-            suggestions += [row[0] for row in cursor.fetchall()]
-
-            # Jobs
-            cursor.execute(
-                "SELECT DISTINCT name FROM jobs WHERE LOWER(name) LIKE ? ORDER BY name LIMIT 5",
-                (f"%{term}%",),
-            )
-            suggestions += [row[0] for row in cursor.fetchall()]
+        suggestions = get_catalog(DB_PATH).suggestion_cache.search(term)
 
     return jsonify(suggestions)
 
@@ -606,18 +1127,8 @@ def class_suggestions():
 @app.route("/verify/<int:key>")
 def verify(key):
     """Verify user email using the provided key."""
-    with sqlite3.connect("main.db") as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM users WHERE key = ?", (key,))
-        user = cursor.fetchone()
-
-    if user is not None:
-        conn = sqlite3.connect("main.db")
-        cursor = conn.cursor()
-        sql = "UPDATE users SET is_verified = ? WHERE id = ?"
-        cursor.execute(sql, (True, user[0]))
-        conn.commit()
-        conn.close()
+    with get_db() as conn:
+        conn.execute("UPDATE users SET is_verified = ? WHERE key = ?", (True, key))
 
     return render_template("login.html", header="login", error="you are verified")
 
@@ -637,6 +1148,14 @@ def server_err(err):
     return render_template("500.html"), 500
 
 
+@app.errorhandler(413)
+def too_large(e):
+    if request.endpoint == "account":
+        flash(AVATAR_TOO_BIG)
+        return redirect(request.url)
+    return "That upload is too big.", 413
+
+
 @app.errorhandler(404)
 def page_not_found(e):
     return render_template("404.html"), 404
@@ -649,4 +1168,6 @@ def search_not_found():
 
 # ------------------- MAIN -------------------
 if __name__ == "__main__":
+    init_app()
+    start_workers()
     app.run(debug=True)
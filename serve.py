@@ -0,0 +1,304 @@
+"""Production launcher: preload the app once, then fork worker processes.
+
+    python serve.py --workers 4 --port 8000
+
+The master imports routes, migrates the database and builds the catalog
+with its indexes before forking, so workers start serving immediately and
+share that memory copy-on-write. Each worker is a threaded server on the
+same listening socket.
+
+Signals to the master:
+    HUP      graceful reload: re-exec with fresh code; old workers finish
+             their requests while the new ones take over the socket
+    TERM/INT finish in-flight requests, then stop
+    USR1     print every process's memory use
+
+/metrics is per process, so each scrape sees whichever worker answered.
+"""
+
+# ------------------- IMPORTS -------------------
+from werkzeug.serving import WSGIRequestHandler, make_server
+import argparse
+import gc
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# ------------------- CONSTANTS -------------------
+WORKERS = int(os.getenv("WEB_WORKERS", os.cpu_count() or 1))
+HOST = os.getenv("HOST", "127.0.0.1")
+PORT = int(os.getenv("PORT", "8000"))
+BACKLOG = 512
+# Workers still busy this long after being asked to stop are killed
+GRACEFUL_TIMEOUT = 30
+# Idle keep-alive connections would otherwise hold a stopping worker open
+KEEPALIVE_TIMEOUT = 5
+# Handed across a reload's exec
+LISTEN_FD_ENV = "SERVE_LISTEN_FD"
+RETIRING_ENV = "SERVE_RETIRING"
+SIGNALS = {signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD, signal.SIGUSR1}
+
+
+# ------------------- MEMORY -------------------
+def memory(pid="self"):
+    """Resident, proportional and private memory of a process in MB.
+
+    Private is what the process doesn't share with the master, so it is
+    what each extra worker really costs.
+    """
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if value.strip().endswith("kB"):
+                    fields[name] = int(value.split()[0])
+    except OSError:
+        # Not Linux: peak RSS is the best there is
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == "darwin":
+            peak //= 1024
+        return {"rss": peak / 1024, "pss": None, "private": None}
+    private = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    return {
+        "rss": fields.get("Rss", 0) / 1024,
+        "pss": fields.get("Pss", 0) / 1024,
+        "private": private / 1024,
+    }
+
+
+def describe(usage):
+    text = f"rss {usage['rss']:.1f} MB"
+    if usage["pss"] is not None:
+        text += f", pss {usage['pss']:.1f} MB, private {usage['private']:.1f} MB"
+    return text
+
+
+# ------------------- PRELOAD -------------------
+def preload():
+    """Import the app and build everything workers would otherwise each build."""
+    started = time.perf_counter()
+    import routes
+    from db import close_pools
+
+    routes.init_app()
+    imported = time.perf_counter()
+    catalog = routes.get_catalog(routes.DB_PATH)
+    catalog.suggestions
+    catalog.bundle
+    loaded = time.perf_counter()
+
+    # Connections can't cross a fork, and frozen objects aren't touched by
+    # the children's garbage collector, so their pages stay shared
+    close_pools()
+    gc.collect()
+    gc.freeze()
+    print(
+        f"preloaded in {(loaded - started) * 1000:.0f} ms "
+        f"(import {(imported - started) * 1000:.0f} ms, "
+        f"catalog v{catalog.version} {(loaded - imported) * 1000:.0f} ms), "
+        f"{describe(memory())}",
+        flush=True,
+    )
+    return routes.app
+
+
+# ------------------- WORKERS -------------------
+class RequestHandler(WSGIRequestHandler):
+    timeout = KEEPALIVE_TIMEOUT
+
+
+def run_worker(app, sock, forked):
+    """Serve on sock until TERM, then drain in-flight requests."""
+    from routes import start_workers
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+    host, port = sock.getsockname()[:2]
+    server = make_server(
+        host,
+        port,
+        app,
+        threaded=True,
+        request_handler=RequestHandler,
+        fd=sock.fileno(),
+    )
+    # shutdown() waits for serve_forever, so it can't run on this thread
+    signal.signal(
+        signal.SIGTERM,
+        lambda *_: threading.Thread(target=server.shutdown, daemon=True).start(),
+    )
+    # Started while the master's signals are still blocked, so only this
+    # thread ever handles them
+    start_workers()
+    signal.pthread_sigmask(signal.SIG_UNBLOCK, SIGNALS)
+    print(
+        f"worker {os.getpid()} ready in {(time.perf_counter() - forked) * 1000:.1f} ms, "
+        f"{describe(memory())}",
+        flush=True,
+    )
+    server.serve_forever()
+    # Waits for the request threads still running
+    server.server_close()
+
+
+class Master:
+    """Keeps the worker processes running and handles the signals above."""
+
+    def __init__(self, app, sock, workers, retiring=()):
+        self.app = app
+        self.sock = sock
+        self.size = workers
+        self.workers = set()
+        self.retiring = set(retiring)
+
+    def spawn(self):
+        forked = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                run_worker(self.app, self.sock, forked)
+            except BaseException as e:
+                print(f"worker {os.getpid()} crashed: {e!r}", flush=True)
+                status = 1
+            finally:
+                sys.stdout.flush()
+                # Skip the master's atexit handlers and thread joins
+                os._exit(status)
+        self.workers.add(pid)
+
+    def run(self, started):
+        signal.pthread_sigmask(signal.SIG_BLOCK, SIGNALS)
+        for _ in range(self.size):
+            self.spawn()
+        # Only now is the new generation listening, so the old one can go
+        self.signal_all(self.retiring, signal.SIGTERM)
+        host, port = self.sock.getsockname()[:2]
+        print(
+            f"listening on http://{host}:{port} with {self.size} workers, "
+            f"up in {(time.perf_counter() - started) * 1000:.0f} ms",
+            flush=True,
+        )
+        while True:
+            info = signal.sigtimedwait(SIGNALS, 1.0)
+            self.reap()
+            if info is None or info.si_signo == signal.SIGCHLD:
+                pass
+            elif info.si_signo in (signal.SIGTERM, signal.SIGINT):
+                self.stop()
+                return
+            elif info.si_signo == signal.SIGHUP:
+                self.reload()
+            elif info.si_signo == signal.SIGUSR1:
+                self.report()
+            while len(self.workers) < self.size:
+                self.spawn()
+
+    def reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if not pid:
+                return
+            if pid in self.workers and status:
+                print(f"worker {pid} exited with status {status}, restarting")
+            self.workers.discard(pid)
+            self.retiring.discard(pid)
+
+    def signal_all(self, pids, sig):
+        for pid in list(pids):
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def stop(self):
+        everyone = self.workers | self.retiring
+        self.signal_all(everyone, signal.SIGTERM)
+        deadline = time.monotonic() + GRACEFUL_TIMEOUT
+        while (self.workers or self.retiring) and time.monotonic() < deadline:
+            signal.sigtimedwait({signal.SIGCHLD}, 0.1)
+            self.reap()
+        self.signal_all(self.workers | self.retiring, signal.SIGKILL)
+        print("stopped", flush=True)
+
+    def reload(self):
+        """Re-exec the master with fresh code, keeping the socket and the old workers.
+
+        The new code is import-checked first; if it's broken the current
+        workers carry on as they are. The check runs init_app against a
+        scratch database, so new migrations are tried out there and only
+        reach the live database once the reload goes ahead.
+        """
+        with tempfile.TemporaryDirectory(prefix="serve-check-") as scratch:
+            check = subprocess.run(
+                [sys.executable, "-c", "import routes; routes.init_app()"],
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                env={
+                    **os.environ,
+                    "DB_PATH": os.path.join(scratch, "check.db"),
+                    "AVATAR_FOLDER": os.path.join(scratch, "avatars"),
+                },
+                capture_output=True,
+                text=True,
+            )
+        if check.returncode:
+            print(f"reload aborted, the new code fails to import:\n{check.stderr}")
+            return
+        print("reloading", flush=True)
+        os.set_inheritable(self.sock.fileno(), True)
+        os.environ[LISTEN_FD_ENV] = str(self.sock.fileno())
+        os.environ[RETIRING_ENV] = ",".join(
+            str(pid) for pid in self.workers | self.retiring
+        )
+        os.execv(sys.executable, sys.orig_argv)
+
+    def report(self):
+        total = memory()
+        print(f"master {os.getpid()}: {describe(total)}")
+        for pid in sorted(self.workers):
+            try:
+                print(f"worker {pid}: {describe(memory(pid))}")
+            except OSError:
+                pass
+        sys.stdout.flush()
+
+
+# ------------------- MAIN -------------------
+def listen(host, port):
+    fd = os.getenv(LISTEN_FD_ENV)
+    if fd:
+        return socket.socket(fileno=int(fd))
+    return socket.create_server((host, port), backlog=BACKLOG)
+
+
+def main():
+    started = time.perf_counter()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    args = parser.parse_args()
+
+    # Bind before the slow preload so a reload never drops connections
+    sock = listen(args.host, args.port)
+    retiring = [int(pid) for pid in os.getenv(RETIRING_ENV, "").split(",") if pid]
+    os.environ.pop(LISTEN_FD_ENV, None)
+    os.environ.pop(RETIRING_ENV, None)
+    app = preload()
+    Master(app, sock, args.workers, retiring).run(started)
+
+
+if __name__ == "__main__":
+    main()
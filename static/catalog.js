@@ -0,0 +1,74 @@
+// Searches the catalog bundle (/catalog/<version>.json) in the browser, so
+// typing in a search box doesn't need a request per keystroke.
+const CatalogSearch = {
+    classes: null,
+    jobs: null,
+    names: [],
+    loading: null,
+
+    load(url) {
+        if (!this.loading) {
+            this.loading = fetch(url)
+                .then(res => res.json())
+                .then(bundle => this.index(bundle));
+        }
+        return this.loading;
+    },
+
+    ready() {
+        return this.classes !== null;
+    },
+
+    index(bundle) {
+        const jobsById = new Map();
+        this.jobs = bundle.jobs.map(([id, name]) => {
+            const job = { id, name, lower: (name || '').toLowerCase(), classes: [] };
+            jobsById.set(id, job);
+            return job;
+        });
+        this.classes = bundle.classes.map(([id, name, year, isMandatory, jobIds]) => {
+            const c = { id, name, year, is_mandatory: isMandatory, lower: (name || '').toLowerCase() };
+            c.jobs = jobIds.map(j => jobsById.get(j)).filter(Boolean);
+            c.jobs.forEach(job => job.classes.push(c));
+            return c;
+        });
+        const names = new Set();
+        this.classes.concat(this.jobs).forEach(item => item.name && names.add(item.name));
+        this.names = [...names].sort().map(name => ({ name, lower: name.toLowerCase() }));
+        return this;
+    },
+
+    // Same ranking as /class-suggestions without the typo matching:
+    // exact match, then names starting with the term, then containing it
+    suggest(term, limit = 10) {
+        term = term.trim().toLowerCase();
+        if (!term) return [];
+        const exact = [], prefix = [], contains = [];
+        for (const n of this.names) {
+            if (n.lower === term) exact.push(n.name);
+            else if (n.lower.startsWith(term)) prefix.push(n.name);
+            else if (n.lower.includes(term)) contains.push(n.name);
+        }
+        return exact.concat(prefix, contains).slice(0, limit);
+    },
+
+    // Same answer as /subject-search: the first class match, else the first job
+    find(term) {
+        term = term.trim().toLowerCase();
+        const c = this.classes.find(c => c.lower.includes(term));
+        if (c) {
+            return {
+                type: 'class', id: c.id, name: c.name, year: c.year, is_mandatory: !!c.is_mandatory,
+                jobs: c.jobs.map(j => ({ id: j.id, name: j.name })),
+            };
+        }
+        const j = this.jobs.find(j => j.lower.includes(term));
+        if (j) {
+            return {
+                type: 'job', id: j.id, name: j.name,
+                classes: j.classes.map(c => ({ id: c.id, name: c.name, year: c.year, is_mandatory: !!c.is_mandatory })),
+            };
+        }
+        return { type: 'none' };
+    },
+};
@@ -0,0 +1,332 @@
+# ------------------- IMPORTS -------------------
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from heapq import nsmallest
+from itertools import product
+import threading
+
+from cachetools import LRUCache
+
+# ------------------- CONSTANTS -------------------
+# Cache budget in name positions, so a few broad terms can't crowd out
+# hundreds of narrow ones
+CACHE_POSITIONS = 200000
+# Terms matching more names than this keep only their results, not matches
+MAX_CACHED_MATCHES = 5000
+
+
+# ------------------- HELPERS -------------------
+def grams(text, n):
+    return {text[i : i + n] for i in range(len(text) - n + 1)}
+
+
+def max_typos(term):
+    """How many edits a term may be off by, roughly what Fuse.js forgives."""
+    if len(term) >= 9:
+        return 2
+    if len(term) >= 5:
+        return 1
+    return 0
+
+
+def substring_distance(term, text, limit=None):
+    """Smallest edit distance between term and any substring of text.
+
+    With a limit, gives up as soon as the answer must exceed it and
+    returns limit + 1.
+    """
+    previous = [0] * (len(text) + 1)
+    for i, t in enumerate(term, 1):
+        current = [i]
+        for j, x in enumerate(text, 1):
+            current.append(
+                min(
+                    previous[j] + 1,
+                    current[j - 1] + 1,
+                    previous[j - 1] + (t != x),
+                )
+            )
+        # A row's minimum never goes down again in later rows
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous = current
+    return min(previous)
+
+
+# ------------------- INDEX -------------------
+class SuggestionIndex:
+    """Ranked, typo-tolerant name lookup for the search box.
+
+    Names are kept in one sorted list so prefix matches are a bisect and a
+    short walk. Bigram and trigram posting lists (holding positions in that
+    sorted list) narrow substring and fuzzy matches to a few candidates
+    instead of scanning every name.
+    """
+
+    FUZZY_CANDIDATES = 200
+
+    def __init__(self, names):
+        self.names = sorted({n for n in names if n}, key=lambda n: (n.lower(), n))
+        self.keys = [n.lower() for n in self.names]
+        self.postings = {}
+        # Each distinct word with the names it appears in, so a one-word typo
+        # is checked against the vocabulary rather than against every name
+        self.words = {}
+        for i, key in enumerate(self.keys):
+            for gram in grams(key, 2) | grams(key, 3):
+                posting = self.postings.get(gram)
+                if posting is None:
+                    posting = self.postings[gram] = array("I")
+                posting.append(i)
+            for word in set(key.split()):
+                posting = self.words.get(word)
+                if posting is None:
+                    posting = self.words[word] = array("I")
+                posting.append(i)
+        self.vocabulary = list(self.words)
+        self.word_postings = {}
+        for w, word in enumerate(self.vocabulary):
+            for gram in grams(word, 2):
+                self.word_postings.setdefault(gram, array("I")).append(w)
+
+    def search(self, term, limit=10):
+        """Exact match first, then prefix, substring and finally close typos."""
+        term = term.strip().lower()
+        if not term:
+            return []
+        found = []
+        seen = set()
+
+        def take(i):
+            if i not in seen:
+                seen.add(i)
+                found.append(self.names[i])
+            return len(found) >= limit
+
+        # Exact and prefix matches sit next to each other in sorted order
+        start = bisect_left(self.keys, term)
+        end = start
+        while end < len(self.keys) and self.keys[end].startswith(term):
+            end += 1
+        prefixed = range(start, end)
+        for i in prefixed:
+            if self.keys[i] == term and take(i):
+                return found
+        for i in prefixed:
+            if take(i):
+                return found
+
+        for i in self._candidates(term):
+            if term in self.keys[i] and take(i):
+                return found
+
+        for i in self._fuzzy(term, limit - len(found)):
+            if take(i):
+                return found
+        return found
+
+    def _candidates(self, term):
+        """Positions that might contain term, in name order."""
+        if len(term) == 1:
+            return range(len(self.keys))
+        n = 3 if len(term) >= 3 else 2
+        postings = [self.postings.get(g) for g in grams(term, n)]
+        if not all(postings):
+            return ()
+        return min(postings, key=len)
+
+    def _fuzzy(self, term, limit):
+        """Names with a close match for every word of term, closest first.
+
+        Each word is matched against the vocabulary, then the sets of
+        names holding the matched words are intersected.
+        """
+        words = term.split()
+        if len(words) == 1 and not max_typos(term):
+            return []
+        # A lone letter would match most words; it is checked at the end
+        letters = [w for w in words if len(w) < 2]
+        words = [w for w in words if len(w) >= 2]
+        if not words:
+            return []
+        matched = []
+        for word in words:
+            distances = self._word_matches(word)
+            if not distances:
+                return []
+            matched.append(distances)
+        if len(matched) == 1 and not letters:
+            # Positions are in name order, so each word's first few are its best
+            scored = sorted(
+                (distance, i)
+                for w, distance in matched[0].items()
+                for i in self.words[w][:limit]
+            )
+            return list(dict.fromkeys(i for _, i in scored))[:limit]
+
+        # Per word, the names within each distance, closest first
+        levels = []
+        for distances in matched:
+            by_distance = {}
+            for w, distance in distances.items():
+                by_distance.setdefault(distance, []).append(self.words[w])
+            levels.append(
+                [
+                    (d, set().union(*postings))
+                    for d, postings in sorted(by_distance.items())
+                ]
+            )
+        # Every mix of distances, lowest total first, until enough names
+        combos = sorted(product(*levels), key=lambda c: sum(d for d, _ in c))
+        found = []
+        seen = set()
+        for combo in combos:
+            total = sum(d for d, _ in combo)
+            if len(found) >= limit and total > found[-1][0]:
+                break
+            names = set.intersection(*(names for _, names in combo)) - seen
+            seen |= names
+            if letters:
+                names = {
+                    i
+                    for i in names
+                    if all(letter in self.keys[i] for letter in letters)
+                }
+            found += [(total, i) for i in nsmallest(limit, names)]
+        found.sort()
+        return [i for _, i in found[:limit]]
+
+    def _word_matches(self, word):
+        """{vocabulary word: edit distance} for words close to containing word."""
+        typos = max_typos(word)
+        # q-gram lemma: each edit can break at most two of the word's bigrams
+        word_grams = grams(word, 2)
+        needed = max(len(word_grams) - 2 * typos, 1)
+        hits = Counter()
+        for gram in word_grams:
+            hits.update(self.word_postings.get(gram, ()))
+        distances = {}
+        for w, count in hits.most_common(self.FUZZY_CANDIDATES):
+            if count < needed:
+                break
+            text = self.vocabulary[w]
+            distance = substring_distance(word, text, typos)
+            if distance <= typos:
+                distances[text] = distance
+        return distances
+
+
+# ------------------- CACHE -------------------
+class _Entry:
+    __slots__ = ("matches", "results")
+
+    def __init__(self, matches):
+        self.matches = matches
+        self.results = {}
+
+
+class _Pending:
+    __slots__ = ("done", "results")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.results = None
+
+
+def _entry_size(entry):
+    return 1 + (len(entry.matches) if entry.matches is not None else 0)
+
+
+class SuggestionCache:
+    """LRU of search results in front of one SuggestionIndex.
+
+    Each term keeps every position whose name contains it, in name order.
+    Typing one more letter only ever narrows that set, so "mat" is worked
+    out by filtering what "ma" matched rather than going back to the
+    postings. Threads asking for a term that is already being worked out
+    wait for that answer instead of repeating it. The cache belongs to a
+    catalog snapshot and goes away with it.
+    """
+
+    def __init__(self, index, positions=CACHE_POSITIONS):
+        self.index = index
+        self._entries = LRUCache(maxsize=positions, getsizeof=_entry_size)
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def search(self, term, limit=10):
+        """Same answer as SuggestionIndex.search, from the cache when possible."""
+        term = term.strip().lower()
+        if not term:
+            return []
+        key = (term, limit)
+        with self._lock:
+            entry = self._entries.get(term)
+            if entry is not None and limit in entry.results:
+                return list(entry.results[limit])
+            pending = self._pending.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._pending[key] = _Pending()
+                parent = self._parent(term) if entry is None else entry
+        if not leader:
+            pending.done.wait()
+            if pending.results is not None:
+                return list(pending.results)
+            return self.index.search(term, limit)
+
+        try:
+            if entry is None:
+                entry = _Entry(self._matches(term, parent))
+            results = self._rank(term, entry.matches, limit)
+            pending.results = entry.results[limit] = tuple(results)
+            with self._lock:
+                self._entries[term] = entry
+        finally:
+            with self._lock:
+                del self._pending[key]
+            pending.done.set()
+        return list(results)
+
+    def _parent(self, term):
+        """Longest cached prefix of term that kept its matches."""
+        for end in range(len(term) - 1, 0, -1):
+            entry = self._entries.get(term[:end])
+            if entry is not None and entry.matches is not None:
+                return entry
+        return None
+
+    def _matches(self, term, parent):
+        keys = self.index.keys
+        if parent is not None:
+            candidates = parent.matches
+        else:
+            candidates = self.index._candidates(term)
+            if len(term) <= 3 and len(candidates) > MAX_CACHED_MATCHES:
+                # Too broad to be worth keeping; search() stops at the limit
+                return None
+        matches = array("I")
+        for i in candidates:
+            if term in keys[i]:
+                if len(matches) == MAX_CACHED_MATCHES:
+                    return None
+                matches.append(i)
+        return matches
+
+    def _rank(self, term, matches, limit):
+        if matches is None:
+            return self.index.search(term, limit)
+        keys = self.index.keys
+        names = self.index.names
+        # Name order puts the exact match first among the prefixed ones
+        ranked = [i for i in matches if keys[i].startswith(term)]
+        ranked += [i for i in matches if not keys[i].startswith(term)]
+        found = [names[i] for i in ranked[:limit]]
+        if len(found) < limit:
+            seen = set(ranked)
+            for i in self.index._fuzzy(term, limit - len(found)):
+                if i not in seen:
+                    seen.add(i)
+                    found.append(names[i])
+        return found
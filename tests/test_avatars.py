@@ -0,0 +1,38 @@
+import os
+import tempfile
+import unittest
+
+from avatars import MAX_UPLOAD_BYTES, AvatarStore
+from metrics import BACKGROUND_ERRORS
+import routes
+
+
+class AdoptLegacyAvatarTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.images = os.path.join(self.folder.name, "images")
+        os.makedirs(self.images)
+        self.saved = routes.avatar_store, routes.app.config["UPLOAD_FOLDER"]
+        routes.avatar_store = AvatarStore(os.path.join(self.folder.name, "avatars"))
+        routes.app.config["UPLOAD_FOLDER"] = self.images
+
+    def tearDown(self):
+        routes.avatar_store, routes.app.config["UPLOAD_FOLDER"] = self.saved
+        self.folder.cleanup()
+
+    def test_oversized_legacy_picture_is_kept(self):
+        with open(os.path.join(self.images, "big.jpg"), "wb") as f:
+            f.write(b"\0" * (MAX_UPLOAD_BYTES + 1))
+        errors = BACKGROUND_ERRORS.value("avatars")
+
+        with routes.app.app_context():
+            pfp = routes.adopt_legacy_avatar("someone", "big.jpg")
+
+        self.assertEqual(pfp, "big.jpg")
+        self.assertEqual(BACKGROUND_ERRORS.value("avatars"), errors + 1)
+        self.assertTrue(os.path.exists(os.path.join(self.images, "big.jpg")))
+        self.assertEqual(os.listdir(routes.avatar_store.originals), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
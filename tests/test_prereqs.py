@@ -0,0 +1,36 @@
+import unittest
+
+from catalog import ClassRow
+from prereqs import PrerequisiteGraph
+
+
+class PrerequisiteClosureTest(unittest.TestCase):
+    def graph(self, *classes):
+        return PrerequisiteGraph([ClassRow(*c) for c in classes])
+
+    def test_chain(self):
+        graph = self.graph(
+            (1, "Art", 11, 0, "Drawing"),
+            (2, "Drawing", 10, 0, "Sketching"),
+            (3, "Sketching", 9, 0, None),
+        )
+        self.assertEqual(graph.closure(1), {2, 3})
+        self.assertEqual(graph.closure(2), {3})
+        self.assertEqual(graph.closure(3), set())
+
+    def test_three_class_cycle(self):
+        # Same-year classes are co-requisites, so A -> B -> C -> A
+        graph = self.graph(
+            (1, "A", 10, 0, "B"),
+            (2, "B", 10, 0, "C"),
+            (3, "C", 10, 0, "A"),
+            (4, "D", 11, 0, "A"),
+        )
+        self.assertEqual(graph.closure(1), {2, 3})
+        self.assertEqual(graph.closure(2), {1, 3})
+        self.assertEqual(graph.closure(3), {1, 2})
+        self.assertEqual(graph.closure(4), {1, 2, 3})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+# ------------------- IMPORTS -------------------
+import threading
+
+from metrics import report_error
+
+
+# ------------------- WORKER -------------------
+class BackgroundWorker:
+    """A daemon thread that calls step() whenever woken or every interval.
+
+    step() returning something truthy means there may be more to do, so it
+    is called again straight away. Errors are reported and the thread
+    carries on. The thread is started on first use in each process, so a
+    forked worker gets its own.
+    """
+
+    def __init__(self, name, step, interval):
+        self.name = name
+        self.step = step
+        self.interval = interval
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the thread unless it is already running in this process."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name=self.name, daemon=True
+                )
+                self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            try:
+                busy = self.step()
+            except Exception as e:
+                report_error(self.name, e)
+                busy = False
+            if not busy:
+                self._wake.wait(self.interval)
+                self._wake.clear()